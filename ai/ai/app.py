@@ -1,23 +1,61 @@
 from flask import Flask, render_template, request, jsonify
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.utils
-import json
 import os
+import time
+import queue
+import threading
 import requests
-from datetime import datetime, timedelta
-from huggingface_hub import InferenceClient
+from requests.adapters import HTTPAdapter
+from concurrent.futures import Future
+from datetime import datetime
 from flask_cors import CORS
+from bizzybuddy_routes import register as register_bizzybuddy_routes
+from sales_store import SalesStore
+
+try:
+    import orjson
+    from flask.json.provider import JSONProvider
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    from flask_compress import Compress
+    COMPRESS_AVAILABLE = True
+except ImportError:
+    COMPRESS_AVAILABLE = False
 
 app = Flask(__name__)
 CORS(app)
 
+if COMPRESS_AVAILABLE:
+    app.config['COMPRESS_MIN_SIZE'] = 512
+    Compress(app)
+
+# Read-only endpoints that browsers and proxies may briefly cache
+CACHEABLE_PATHS = ('/api/bizzybuddy/inventory', '/api/bizzybuddy/sales', '/api/bizzybuddy/analytics')
+
+if ORJSON_AVAILABLE:
+    class ORJSONProvider(JSONProvider):
+        """Serialize Flask JSON responses with orjson"""
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = ORJSONProvider(app)
+
 # Hugging Face configuration
 HF_TOKEN = os.getenv("HUGGING_FACE_TOKEN", "your_token_here")  # Use environment variable
 API_URL = "https://api-inference.huggingface.co/models/tabularisai/augini"
 headers = {"Authorization": f"Bearer {HF_TOKEN}"}
 
+# Shared session so Hugging Face calls reuse pooled keep-alive connections
+hf_session = requests.Session()
+hf_session.headers.update(headers)
+hf_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
 # Initialize inventory and sales data
 inventory_data = [
     {"id": 1, "product": "Laptop", "category": "Electronics", "price": 50000, "quantity": 50, "min_quantity": 10},
@@ -25,29 +63,89 @@ inventory_data = [
     {"id": 3, "product": "Headphones", "category": "Electronics", "price": 10000, "quantity": 200, "min_quantity": 30}
 ]
 
-sales_data = []
+# Index inventory items by id so lookups don't scan the list
+inventory_by_id = {item['id']: item for item in inventory_data}
+_next_id = max(inventory_by_id, default=0) + 1
+
+NUMERIC_FIELDS = ('price', 'quantity', 'min_quantity')
+# Fields every new item needs so category totals can include it
+REQUIRED_FIELDS = ('category', 'quantity', 'price')
+
+# Per-category running totals, kept in step with every inventory mutation
+category_stats = {}
+
+def track_category(item, sign=1):
+    # Read every field first so a malformed item never leaves an empty entry behind
+    category, quantity, price = item['category'], item['quantity'], item['price']
+    stats = category_stats.setdefault(category, {'quantity_sum': 0, 'price_sum': 0, 'count': 0})
+    stats['quantity_sum'] += sign * quantity
+    stats['price_sum'] += sign * price
+    stats['count'] += sign
+    if stats['count'] <= 0:
+        del category_stats[category]
+
+for item in inventory_data:
+    track_category(item)
+
+# Sales are persisted in SQLite so analytics can aggregate with indexed queries
+SALES_DB_PATH = os.getenv("SALES_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "sales.db"))
+sales_store = SalesStore(SALES_DB_PATH)
+
+# Cached analytics, rebuilt only after a sale or inventory change (or TTL expiry)
+ANALYTICS_CACHE_TTL = 5  # seconds
+_insights_cache = None
+_charts_cache = None
+_bizzybuddy_inventory_cache = None
+_cache_built_at = 0.0
+_cache_dirty = True
+
+def mark_analytics_dirty():
+    global _cache_dirty
+    _cache_dirty = True
+
+def _refresh_analytics_cache():
+    global _insights_cache, _charts_cache, _bizzybuddy_inventory_cache, _cache_built_at, _cache_dirty
+    if _cache_dirty or time.monotonic() - _cache_built_at > ANALYTICS_CACHE_TTL:
+        _cache_dirty = False
+        _insights_cache = _build_insights()
+        _charts_cache = _build_charts(_insights_cache)
+        _bizzybuddy_inventory_cache = _build_bizzybuddy_inventory()
+        _cache_built_at = time.monotonic()
 
 def save_sale(product_id, quantity, price):
+    now = datetime.now()
     sale = {
         "product_id": product_id,
-        "product": next(item["product"] for item in inventory_data if item["id"] == product_id),
+        "product": inventory_by_id[product_id]["product"],
         "quantity": quantity,
         "price": price,
         "total": quantity * price,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now.isoformat(),
+        "ts": now.timestamp()
     }
-    sales_data.append(sale)
+    sales_store.add(sale)
+    mark_analytics_dirty()
     return sale
 
+def sell_product(product, quantity):
+    # Update inventory
+    product['quantity'] -= quantity
+    category_stats[product['category']]['quantity_sum'] -= quantity
+
+    # Record sale
+    return save_sale(product['id'], quantity, product['price'])
+
+def _start_of_month():
+    return datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+
 def get_daily_sales():
-    today = datetime.now().date()
-    return [sale for sale in sales_data if datetime.fromisoformat(sale["timestamp"]).date() == today]
+    start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return sales_store.since(start_of_day.timestamp())
 
 def get_monthly_sales():
-    current_month = datetime.now().month
-    return [sale for sale in sales_data if datetime.fromisoformat(sale["timestamp"]).month == current_month]
+    return sales_store.since(_start_of_month())
 
-def generate_insights():
+def _build_insights():
     # Initialize default insights
     insights = {
         'top_products': {},
@@ -55,72 +153,59 @@ def generate_insights():
         'category_performance': []
     }
 
-    try:
-        if sales_data:
-            # Top selling products
-            sales_df = pd.DataFrame(sales_data)
-            top_products = sales_df.groupby('product')['quantity'].sum().sort_values(ascending=False).head(3)
-            insights['top_products'] = top_products.to_dict()
-
-            # Revenue trend
-            sales_df['date'] = pd.to_datetime(sales_df['timestamp']).dt.date
-            revenue_trend = sales_df.groupby('date')['total'].sum()
-            # Convert date to string for JSON serialization
-            insights['revenue_trend'] = {str(k): v for k, v in revenue_trend.to_dict().items()}
-
-        # Category performance
-        inventory_df = pd.DataFrame(inventory_data)
-        category_performance = inventory_df.groupby('category').agg({
-            'quantity': 'sum',
-            'price': 'mean'
-        }).reset_index()
-        insights['category_performance'] = category_performance.to_dict('records')
+    # Top selling products and revenue trend (keyed by ISO date)
+    insights['top_products'] = sales_store.top_products(3)
+    insights['revenue_trend'] = sales_store.revenue_by_date()
 
-    except Exception as e:
-        print(f"Error generating insights: {str(e)}")
+    # Category performance
+    insights['category_performance'] = [
+        {'category': category, 'quantity': stats['quantity_sum'], 'price': stats['price_sum'] / stats['count']}
+        for category, stats in sorted(category_stats.items())
+        if stats['count'] > 0
+    ]
 
     return insights
 
-def generate_charts():
-    # Initialize default charts
-    empty_fig = px.bar(title='No data available')
-    charts = {
-        'top_products': json.dumps(empty_fig, cls=plotly.utils.PlotlyJSONEncoder),
-        'revenue_trend': json.dumps(empty_fig, cls=plotly.utils.PlotlyJSONEncoder)
+def _build_charts(insights):
+    # Raw series only; the browser builds the Plotly figures
+    top_products = insights['top_products']
+    revenue_trend = insights['revenue_trend']
+    return {
+        'top_products': {'x': list(top_products), 'y': list(top_products.values())},
+        'revenue_trend': {'x': list(revenue_trend), 'y': list(revenue_trend.values())}
     }
 
-    try:
-        if sales_data:
-            # Top products chart
-            sales_df = pd.DataFrame(sales_data)
-            top_products = sales_df.groupby('product')['quantity'].sum().sort_values(ascending=False).head(3)
-            top_products_fig = px.bar(
-                top_products.reset_index(),
-                x='product',
-                y='quantity',
-                title='Top Selling Products'
-            )
-            charts['top_products'] = json.dumps(top_products_fig, cls=plotly.utils.PlotlyJSONEncoder)
-
-            # Revenue trend chart
-            sales_df['date'] = pd.to_datetime(sales_df['timestamp']).dt.date
-            revenue_trend = sales_df.groupby('date')['total'].sum()
-            revenue_trend_fig = px.line(
-                revenue_trend.reset_index(),
-                x='date',
-                y='total',
-                title='Revenue Trend'
-            )
-            charts['revenue_trend'] = json.dumps(revenue_trend_fig, cls=plotly.utils.PlotlyJSONEncoder)
+def _build_bizzybuddy_inventory():
+    # Convert inventory data to BizzyBuddy format
+    bizzybuddy_inventory = []
+    now = datetime.now().isoformat()
+    for item in inventory_data:
+        bizzybuddy_item = {
+            "id": str(item['id']),
+            "name": item['product'],
+            "description": f"{item['category']} product",
+            "price": item['price'],
+            "stockQuantity": item['quantity'],
+            "category": item['category'],
+            "createdAt": now,
+            "updatedAt": now,
+            "imageUrl": None,
+            "attributes": {}
+        }
+        bizzybuddy_inventory.append(bizzybuddy_item)
+    return bizzybuddy_inventory
 
-    except Exception as e:
-        print(f"Error generating charts: {str(e)}")
+def generate_insights():
+    _refresh_analytics_cache()
+    return _insights_cache
 
-    return charts
+def generate_charts():
+    _refresh_analytics_cache()
+    return _charts_cache
 
 def query_huggingface(payload):
     try:
-        response = requests.post(API_URL, headers=headers, json=payload)
+        response = hf_session.post(API_URL, json=payload, timeout=30)
         if response.status_code == 200:
             return response.json()
         else:
@@ -130,6 +215,90 @@ def query_huggingface(payload):
         print(f"Error querying Hugging Face: {str(e)}")
         return None
 
+# Only send several questions in one request when the model is known to answer
+# {"inputs": {"question": [...], "context": ...}} with one answer per question, in order
+HF_BATCH_QUESTIONS = os.getenv("HF_BATCH_QUESTIONS", "false").lower() == "true"
+ANALYZE_PARAMETERS = {"temperature": 0.7}
+
+def analysis_context():
+    return {
+        "inventory": inventory_data,
+        "sales": sales_store.all()
+    }
+
+class HuggingFaceBatcher:
+    """Collect concurrent analyze questions and ask them against one shared context"""
+
+    def __init__(self, context_provider, batch_questions=False, max_batch_size=16, max_wait=0.05, timeout=65):
+        self.context_provider = context_provider
+        self.batch_questions = batch_questions
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._pending = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, question):
+        if not self.batch_questions:
+            return query_huggingface(self._single_payload(question, self.context_provider()))
+
+        self._ensure_worker()
+        future = Future()
+        self._pending.put((question, future))
+        return future.result(timeout=self.timeout)
+
+    def _single_payload(self, question, context):
+        return {"inputs": {"question": question, "context": context, "parameters": ANALYZE_PARAMETERS}}
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._pending.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                # Never leave a request waiting on a batch that blew up
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _dispatch(self, batch):
+        # One snapshot of inventory and sales for the whole batch
+        context = self.context_provider()
+        if len(batch) == 1:
+            question, future = batch[0]
+            future.set_result(query_huggingface(self._single_payload(question, context)))
+            return
+
+        result = query_huggingface({
+            "inputs": {"question": [question for question, _ in batch], "context": context},
+            "parameters": ANALYZE_PARAMETERS
+        })
+        if isinstance(result, list) and len(result) == len(batch):
+            for (_, future), answer in zip(batch, result):
+                future.set_result(answer)
+        else:
+            # The endpoint did not answer per question; fall back to one call each
+            for question, future in batch:
+                future.set_result(query_huggingface(self._single_payload(question, context)))
+
+hf_batcher = HuggingFaceBatcher(analysis_context, batch_questions=HF_BATCH_QUESTIONS)
+
 @app.route('/')
 def index():
     insights = generate_insights()
@@ -146,21 +315,40 @@ def manage_inventory():
     if request.method == 'GET':
         return jsonify(inventory_data)
 
+    global _next_id
     data = request.json
     if request.method == 'POST':
+        try:
+            for field in NUMERIC_FIELDS:
+                if field in data:
+                    data[field] = int(data[field])
+        except (ValueError, TypeError):
+            return jsonify({"error": f"{', '.join(NUMERIC_FIELDS)} must be valid integers"}), 400
+
         if 'id' in data:  # Update existing item
-            for item in inventory_data:
-                if item['id'] == data['id']:
-                    item.update(data)
-                    break
+            item = inventory_by_id.get(data['id'])
+            if item:
+                track_category(item, -1)
+                item.update(data)
+                track_category(item)
         else:  # Add new item
-            new_id = max(item['id'] for item in inventory_data) + 1 if inventory_data else 1
-            data['id'] = new_id
+            missing = [field for field in REQUIRED_FIELDS if field not in data]
+            if missing:
+                return jsonify({"error": f"Missing required fields: {', '.join(missing)}"}), 400
+            data['id'] = _next_id
+            _next_id += 1
             inventory_data.append(data)
+            inventory_by_id[data['id']] = data
+            track_category(data)
+        mark_analytics_dirty()
         return jsonify({"success": True})
 
     if request.method == 'DELETE':
-        inventory_data[:] = [item for item in inventory_data if item['id'] != data['id']]
+        item = inventory_by_id.pop(data['id'], None)
+        if item is not None:
+            track_category(item, -1)
+            inventory_data[:] = [item for item in inventory_data if item['id'] != data['id']]
+        mark_analytics_dirty()
         return jsonify({"success": True})
 
 @app.route('/api/sales', methods=['POST'])
@@ -170,43 +358,27 @@ def record_sale():
     quantity = data['quantity']
 
     # Find the product
-    product = next(item for item in inventory_data if item['id'] == product_id)
+    product = inventory_by_id.get(product_id)
+    if not product:
+        return jsonify({"error": "Product not found"}), 404
 
     if product['quantity'] < quantity:
         return jsonify({"error": "Insufficient stock"}), 400
 
-    # Update inventory
-    product['quantity'] -= quantity
-
-    # Record sale
-    sale = save_sale(product_id, quantity, product['price'])
+    sale = sell_product(product, quantity)
 
     return jsonify({
         "success": True,
         "sale": sale,
-        "inventory": inventory_data
+        "inventory": [product]
     })
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze():
     question = request.json.get('question', '')
 
-    # Prepare data for Hugging Face
-    data_payload = {
-        "inputs": {
-            "question": question,
-            "context": {
-                "inventory": inventory_data,
-                "sales": sales_data
-            },
-            "parameters": {
-                "temperature": 0.7,
-            }
-        }
-    }
-
     try:
-        result = query_huggingface(data_payload)
+        result = hf_batcher.submit(question)
         return jsonify({
             "answer": result if result else "I don't have enough information to answer that question.",
             "insights": generate_insights(),
@@ -223,30 +395,14 @@ def analyze():
 # BizzyBuddy specific API endpoints
 @app.route('/api/bizzybuddy/inventory', methods=['GET'])
 def get_bizzybuddy_inventory():
-    # Convert inventory data to BizzyBuddy format
-    bizzybuddy_inventory = []
-    for item in inventory_data:
-        bizzybuddy_item = {
-            "id": str(item['id']),
-            "name": item['product'],
-            "description": f"{item['category']} product",
-            "price": item['price'],
-            "stockQuantity": item['quantity'],
-            "category": item['category'],
-            "createdAt": datetime.now().isoformat(),
-            "updatedAt": datetime.now().isoformat(),
-            "imageUrl": None,
-            "attributes": {}
-        }
-        bizzybuddy_inventory.append(bizzybuddy_item)
-
-    return jsonify(bizzybuddy_inventory)
+    _refresh_analytics_cache()
+    return jsonify(_bizzybuddy_inventory_cache)
 
 @app.route('/api/bizzybuddy/sales', methods=['GET'])
 def get_bizzybuddy_sales():
     # Convert sales data to BizzyBuddy format
     bizzybuddy_sales = []
-    for sale in sales_data:
+    for sale in sales_store.all():
         bizzybuddy_sale = {
             "id": f"sale_{len(bizzybuddy_sales) + 1}",
             "productId": str(sale['product_id']),
@@ -264,11 +420,13 @@ def get_bizzybuddy_analytics():
     insights = generate_insights()
     charts = generate_charts()
 
+    now = datetime.now()
+    week_start = time.time() - 7 * 86400
     analytics_data = {
         "salesSummary": {
-            "daily": sum(sale['total'] for sale in get_daily_sales()),
-            "weekly": sum(sale['total'] for sale in sales_data if datetime.fromisoformat(sale['timestamp']) > (datetime.now() - timedelta(days=7))),
-            "monthly": sum(sale['total'] for sale in get_monthly_sales())
+            "daily": sales_store.total_for_date(now.date().isoformat()),
+            "weekly": sales_store.total_since(week_start),
+            "monthly": sales_store.total_since(_start_of_month())
         },
         "topProducts": insights['top_products'],
         "categoryPerformance": insights['category_performance'],
@@ -277,46 +435,13 @@ def get_bizzybuddy_analytics():
 
     return jsonify(analytics_data)
 
-@app.route('/api/bizzybuddy/record-sale', methods=['POST'])
-def record_bizzybuddy_sale():
-    data = request.json
-
-    # Check if required fields exist and are not None
-    if not data:
-        return jsonify({"error": "Missing request body"}), 400
-
-    if 'productId' not in data or data.get('productId') is None:
-        return jsonify({"error": "Missing or invalid productId parameter"}), 400
-
-    if 'quantity' not in data or data.get('quantity') is None:
-        return jsonify({"error": "Missing or invalid quantity parameter"}), 400
-
-    try:
-        product_id = int(data.get('productId'))
-        quantity = int(data.get('quantity'))
-    except (ValueError, TypeError):
-        return jsonify({"error": "productId and quantity must be valid integers"}), 400
+register_bizzybuddy_routes(app, inventory_by_id, sell_product)
 
-    # Find the product
-    product = next((item for item in inventory_data if item['id'] == product_id), None)
-
-    if not product:
-        return jsonify({"error": "Product not found"}), 404
-
-    if product['quantity'] < quantity:
-        return jsonify({"error": "Insufficient stock"}), 400
-
-    # Update inventory
-    product['quantity'] -= quantity
-
-    # Record sale
-    sale = save_sale(product_id, quantity, product['price'])
-
-    return jsonify({
-        "success": True,
-        "sale": sale,
-        "inventory": [item for item in inventory_data if item['id'] == product_id]
-    })
+@app.after_request
+def set_cache_headers(response):
+    if request.method == 'GET' and request.path in CACHEABLE_PATHS:
+        response.headers['Cache-Control'] = 'public, max-age=5'
+    return response
 
 # Route to serve the BizzyBuddy test page
 @app.route('/bizzybuddy-test')
@@ -324,4 +449,6 @@ def bizzybuddy_test():
     return render_template('bizzybuddy_test.html')
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5002, host='0.0.0.0')
\ No newline at end of file
+    # Development server only; in production run under gunicorn (see gunicorn.conf.py):
+    #   gunicorn -c gunicorn.conf.py app:app
+    app.run(debug=os.getenv("FLASK_DEBUG", "true").lower() == "true", port=5002, host='0.0.0.0')
\ No newline at end of file
@@ -0,0 +1,50 @@
+from flask import Blueprint, request, jsonify
+
+
+def register(app, inventory_by_id, sell_product):
+    """Install the BizzyBuddy sale-recording endpoint on ``app``.
+
+    ``inventory_by_id`` maps product ids to inventory items and
+    ``sell_product(product, quantity)`` applies the stock change and returns
+    the recorded sale.
+    """
+    bp = Blueprint('bizzybuddy_sales', __name__)
+
+    @bp.route('/api/bizzybuddy/record-sale', methods=['POST'])
+    def record_bizzybuddy_sale():
+        data = request.json
+
+        # Check if required fields exist and are not None
+        if not data:
+            return jsonify({"error": "Missing request body"}), 400
+
+        if 'productId' not in data or data.get('productId') is None:
+            return jsonify({"error": "Missing or invalid productId parameter"}), 400
+
+        if 'quantity' not in data or data.get('quantity') is None:
+            return jsonify({"error": "Missing or invalid quantity parameter"}), 400
+
+        try:
+            product_id = int(data.get('productId'))
+            quantity = int(data.get('quantity'))
+        except (ValueError, TypeError):
+            return jsonify({"error": "productId and quantity must be valid integers"}), 400
+
+        # Find the product
+        product = inventory_by_id.get(product_id)
+
+        if not product:
+            return jsonify({"error": "Product not found"}), 404
+
+        if product['quantity'] < quantity:
+            return jsonify({"error": "Insufficient stock"}), 400
+
+        sale = sell_product(product, quantity)
+
+        return jsonify({
+            "success": True,
+            "sale": sale,
+            "inventory": [product]
+        })
+
+    app.register_blueprint(bp)
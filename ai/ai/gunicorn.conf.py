@@ -0,0 +1,14 @@
+# Gunicorn configuration for the BizzyBuddy analytics app
+# Usage: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5002')}"
+
+# Inventory and sales live in process memory, so keep a single worker and
+# scale request handling with threads instead of extra processes.
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+timeout = 60
+keepalive = 5
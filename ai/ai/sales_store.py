@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+SALE_COLUMNS = "product_id, product, quantity, price, total, timestamp, ts"
+
+
+class SalesStore:
+    """SQLite-backed sales log with indexed date and timestamp columns"""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS sales (
+                    id INTEGER PRIMARY KEY,
+                    product_id INTEGER NOT NULL,
+                    product TEXT NOT NULL,
+                    quantity INTEGER NOT NULL,
+                    price NUMERIC NOT NULL,
+                    total NUMERIC NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    ts REAL NOT NULL,
+                    date TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_ts ON sales(ts)")
+            # Covering indexes let the insight aggregates stream in group order
+            # straight from the index instead of sorting the whole table
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_product_qty ON sales(product, quantity)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sales_date_total ON sales(date, total)")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def add(self, sale):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sales (product_id, product, quantity, price, total, timestamp, ts, date) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (sale["product_id"], sale["product"], sale["quantity"], sale["price"],
+                 sale["total"], sale["timestamp"], sale["ts"], sale["timestamp"][:10])
+            )
+
+    def all(self):
+        return [dict(row) for row in self._query(f"SELECT {SALE_COLUMNS} FROM sales ORDER BY id")]
+
+    def since(self, start_ts):
+        return [dict(row) for row in self._query(
+            f"SELECT {SALE_COLUMNS} FROM sales WHERE ts >= ? ORDER BY id", (start_ts,))]
+
+    def total_for_date(self, date):
+        return self._query("SELECT COALESCE(SUM(total), 0) FROM sales WHERE date = ?", (date,))[0][0]
+
+    def total_since(self, start_ts):
+        return self._query("SELECT COALESCE(SUM(total), 0) FROM sales WHERE ts >= ?", (start_ts,))[0][0]
+
+    def top_products(self, limit):
+        rows = self._query(
+            "SELECT product, SUM(quantity) FROM sales GROUP BY product ORDER BY 2 DESC LIMIT ?", (limit,))
+        return {product: quantity for product, quantity in rows}
+
+    def revenue_by_date(self):
+        rows = self._query("SELECT date, SUM(total) FROM sales GROUP BY date ORDER BY date")
+        return {date: total for date, total in rows}
@@ -6,6 +6,8 @@ Checks if your bucket exists and is properly configured
 
 import os
 import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import storage
 from google.cloud.exceptions import NotFound, Forbidden
 import json
@@ -96,24 +98,36 @@ class BucketStatusChecker:
         print(f"\n🧪 Testing Bucket Operations...")
         
         try:
-            # Test listing objects
-            blobs = list(bucket.list_blobs(max_results=5))
-            print(f"✅ Can list objects: {len(blobs)} objects found")
-            
-            # Test creating a test file
-            test_blob_name = "test/connection_test.txt"
+            # Unique name so the upload can be a create-only write
+            test_blob_name = f"test/connection_test_{uuid.uuid4().hex}.txt"
             test_content = f"Connection test from Python at {os.environ.get('COMPUTERNAME', 'unknown')}"
-            
             blob = bucket.blob(test_blob_name)
-            blob.upload_from_string(test_content, content_type='text/plain')
-            print(f"✅ Can upload files: Created {test_blob_name}")
             
-            # Test reading the file
-            downloaded_content = blob.download_as_string().decode('utf-8')
-            if downloaded_content == test_content:
-                print(f"✅ Can download files: Content matches")
-            else:
-                print(f"⚠️ Download content mismatch")
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                # Test listing objects and creating a test file in parallel
+                list_future = executor.submit(lambda: list(bucket.list_blobs(max_results=5)))
+                upload_future = executor.submit(
+                    blob.upload_from_string, test_content,
+                    content_type='text/plain', if_generation_match=0
+                )
+                
+                blobs = list_future.result()
+                print(f"✅ Can list objects: {len(blobs)} objects found")
+                upload_future.result()
+                print(f"✅ Can upload files: Created {test_blob_name}")
+                
+                # Test reading the file and its metadata concurrently
+                download_future = executor.submit(blob.download_as_bytes)
+                metadata_blob = bucket.blob(test_blob_name)
+                reload_future = executor.submit(metadata_blob.reload)
+                
+                downloaded_content = download_future.result().decode('utf-8')
+                if downloaded_content == test_content:
+                    print(f"✅ Can download files: Content matches")
+                else:
+                    print(f"⚠️ Download content mismatch")
+                reload_future.result()
+                print(f"✅ Can read metadata: {metadata_blob.size} bytes")
             
             # Test deleting the file
             blob.delete()
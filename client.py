@@ -1,4 +1,18 @@
 import socket
+import struct
+
+HEADER = struct.Struct("!I")  # 4-byte big-endian message length
+
+def send_message(wfile, data):
+    wfile.write(HEADER.pack(len(data)) + data)
+    wfile.flush()
+
+def recv_message(rfile):
+    header = rfile.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    (length,) = HEADER.unpack(header)
+    return rfile.read(length)
 
 def main():
     host = "10.113.22.95"  # Change this to match the server's IP if needed
@@ -6,6 +20,9 @@ def main():
 
     client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     client.connect((host, port))
+    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    rfile = client.makefile("rb")
+    wfile = client.makefile("wb")
 
     print("[CONNECTED] Connected to the server.")
 
@@ -14,16 +31,21 @@ def main():
         if not message:
             break
 
-        client.send(message.encode("utf-8"))
-        response = client.recv(1024).decode("utf-8")
-        print(f"[SERVER RESPONSE] {response}")
+        send_message(wfile, message.encode("utf-8"))
+        response = recv_message(rfile)
+        if response is None:
+            print("[SERVER CLOSED] Connection closed by the server.")
+            break
+        print(f"[SERVER RESPONSE] {response.decode('utf-8')}")
 
         cont = input("Do you want to continue? (y/n): ")
         if cont.lower() != "y":
             break
 
+    rfile.close()
+    wfile.close()
     client.close()
     print("[DISCONNECTED] Connection closed.")
 
-if _name_ == "_main_":
-    main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,78 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Depends
+from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Response
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uvicorn
 import os
+import asyncio
 from datetime import datetime
 import uuid
-from models import Document, QueryRequest, SummaryRequest, EmotionRequest, User
+from contextlib import asynccontextmanager
+import shutil
+import tempfile
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from responses import ORJSONResponse, weak_etag, listing_etag, not_modified
+from models import Document, DocumentMetaListAdapter, QueryRequest, SummaryRequest, EmotionRequest, User
 from services.document_service import DocumentService
 from services.llm_service import LLMService
 from services.storage_service import StorageService
 from services.mock_storage_service import MockStorageService
+from services.firebase_auth_service import firebase_auth_service
+from services.executors import shutdown_cpu_executor
 from auth.dependencies import get_current_user, get_current_user_optional, get_user_uid
 
-app = FastAPI(title="TalkToYourDocument API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan: warm auth keys on startup, release worker threads on shutdown"""
+    # Pre-fetch Firebase signing keys so the first authenticated requests don't race for them
+    await firebase_auth_service.warm_up()
+    try:
+        yield
+    finally:
+        shutdown_cpu_executor()
+
+app = FastAPI(title="TalkToYourDocument API", default_response_class=ORJSONResponse, lifespan=lifespan)
+
+# Uploads are copied to disk in chunks of this size instead of read whole
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Starlette keeps uploads up to this size in memory (SpooledTemporaryFile max_size)
+SPOOLED_UPLOAD_MAX_SIZE = 1024 * 1024  # 1 MiB
 
-# Helper function to validate document ownership
-async def validate_document_ownership(document_id: str, user_id: str) -> Document:
+bearer_scheme = HTTPBearer()
+
+# Helper function to authenticate and validate document ownership in one step
+async def authorize_document(
+    document_id: str,
+    credentials: HTTPAuthorizationCredentials
+) -> Tuple[Dict[str, Any], Document]:
     """
-    Validate that the user owns the document and return the document
+    Verify the caller's token and fetch the document concurrently, then check ownership
 
     Args:
         document_id: ID of the document to validate
-        user_id: ID of the user requesting access
+        credentials: Bearer credentials carrying the Firebase ID token
 
     Returns:
-        Document object if user owns it
+        Tuple of (user info, Document) if the user owns the document
 
     Raises:
-        HTTPException: If document not found or user doesn't own it
+        HTTPException: If the token is invalid, the document is not found or the user doesn't own it
     """
-    document = await document_service.get_document(document_id)
+    current_user, document = await asyncio.gather(
+        firebase_auth_service.verify_id_token(credentials.credentials),
+        document_service.get_document(document_id),
+        return_exceptions=True
+    )
+    # Authentication errors take precedence so document existence is never revealed
+    if isinstance(current_user, BaseException):
+        raise current_user
+    if isinstance(document, BaseException):
+        raise document
+
+    user_id = current_user["uid"]
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -40,15 +82,26 @@ async def validate_document_ownership(document_id: str, user_id: str) -> Documen
             detail="Access denied: You can only access your own documents"
         )
 
-    return document
+    return current_user, document
+
+async def owned_document(
+    document_id: str,
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
+) -> Tuple[Dict[str, Any], Document]:
+    """Dependency for routes with a document_id path parameter"""
+    return await authorize_document(document_id, credentials)
+
+# Explicit comma-separated origins (CORS_ORIGINS) allow preflight caching; "*" keeps the old behaviour
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
 
 # CORS middleware configuration
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
 # Initialize storage service first
@@ -76,22 +129,39 @@ async def get_current_user_info(current_user: Dict[str, Any] = Depends(get_curre
     }
 
 @app.get("/documents")
-async def list_documents(current_user: Dict[str, Any] = Depends(get_current_user)):
+async def list_documents(request: Request, current_user: Dict[str, Any] = Depends(get_current_user)):
     """List documents for authenticated user only"""
     user_id = current_user["uid"]
-    return await document_service.list_documents(user_id=user_id)
+    documents = await document_service.list_documents(user_id=user_id)
+
+    # Pollers with an up-to-date listing get a 304 without a body
+    etag = listing_etag(documents)
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    return Response(
+        DocumentMetaListAdapter.dump_json(documents),
+        media_type="application/json",
+        headers={"ETag": etag}
+    )
 
 @app.get("/documents/{document_id}")
 async def get_document(
     document_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    authorized: Tuple[Dict[str, Any], Document] = Depends(owned_document)
 ):
     """Get a specific document (requires authentication and ownership)"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership and return the document
-        document = await validate_document_ownership(document_id, user_id)
+        # Ownership was validated alongside token verification
+        _, document = authorized
+
+        etag = weak_etag(document.document_id, document.updated_at)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        response.headers["ETag"] = etag
         return document
     except HTTPException:
         raise
@@ -106,47 +176,58 @@ async def upload_document(
     """Upload and process a document (requires authentication)"""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
+    # The filename ends up in storage paths, so it must not carry directories
+    if os.path.basename(file.filename.replace("\\", "/")) != file.filename or file.filename in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid filename")
 
     # Generate unique document ID
     doc_id = str(uuid.uuid4())
     user_id = current_user["uid"]  # Always required now
 
-    # Save file temporarily (Windows compatible)
-    import tempfile
-    temp_dir = tempfile.gettempdir()
-    temp_path = os.path.join(temp_dir, f"{doc_id}_{file.filename}")
+    # Small uploads are still in Starlette's in-memory spool: process them without touching disk
+    if file.size is not None and file.size <= SPOOLED_UPLOAD_MAX_SIZE:
+        try:
+            document = await document_service.process_document_from_fileobj(file.file, doc_id, file.filename, user_id)
+            await llm_service.index_document(document)
+            return document
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    # Save larger files temporarily (Windows compatible) so storage can upload them in parallel parts
+    temp_path = None
     try:
-        with open(temp_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        # Copy the spooled upload to disk off the event loop
+        temp_path = await run_in_threadpool(_spill_upload, file.file, os.path.splitext(file.filename)[1])
 
-        # Process document
+        # Process and store document
         document = await document_service.process_document(temp_path, doc_id, file.filename, user_id)
 
-        # Store document
-        await storage_service.store_document(document, temp_path)
-
-        # Clean up temp file
-        os.remove(temp_path)
+        # Chunk and embed once so queries only embed the question; failures only cost retrieval
+        await llm_service.index_document(document)
 
         return document
     except Exception as e:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if temp_path is not None:
+            Path(temp_path).unlink(missing_ok=True)
+
+def _spill_upload(source, suffix: str) -> str:
+    """Copy an uploaded file object to a fresh temporary file in fixed-size chunks; returns its path"""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as buffer:
+        shutil.copyfileobj(source, buffer, length=UPLOAD_CHUNK_SIZE)
+        return buffer.name
 
 @app.post("/documents/{document_id}/chat")
 async def chat_with_document(
     document_id: str,
     request: QueryRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    authorized: Tuple[Dict[str, Any], Document] = Depends(owned_document)
 ):
     """Chat with a specific document using AI (requires authentication and ownership)"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership
-        await validate_document_ownership(document_id, user_id)
+        # Ownership was validated alongside token verification
+        _, document = authorized
 
         # Ensure the document_id in the request matches the path parameter
         if request.document_id != document_id:
@@ -154,6 +235,7 @@ async def chat_with_document(
 
         response = await llm_service.query_document(
             document_id=request.document_id,
+            document=document,
             query=request.query,
             query_language=request.query_language,
             target_language=request.target_language
@@ -167,17 +249,16 @@ async def chat_with_document(
 @app.post("/query")
 async def query_document(
     request: QueryRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ):
     """Query a document using natural language (requires authentication) - Legacy endpoint"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership
-        await validate_document_ownership(request.document_id, user_id)
+        # Verify the token and validate document ownership together
+        _, document = await authorize_document(request.document_id, credentials)
 
         response = await llm_service.query_document(
             document_id=request.document_id,
+            document=document,
             query=request.query,
             query_language=request.query_language,
             target_language=request.target_language
@@ -191,17 +272,16 @@ async def query_document(
 @app.post("/summary")
 async def summarize_document(
     request: SummaryRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ):
     """Generate a summary of the document (requires authentication)"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership
-        await validate_document_ownership(request.document_id, user_id)
+        # Verify the token and validate document ownership together
+        _, document = await authorize_document(request.document_id, credentials)
 
         response = await llm_service.summarize_document(
             document_id=request.document_id,
+            document=document,
             target_language=request.target_language
         )
         return response
@@ -213,17 +293,16 @@ async def summarize_document(
 @app.post("/emotion")
 async def analyze_emotion(
     request: EmotionRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)
 ):
     """Analyze emotional tone of the document (requires authentication)"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership
-        await validate_document_ownership(request.document_id, user_id)
+        # Verify the token and validate document ownership together
+        _, document = await authorize_document(request.document_id, credentials)
 
         response = await llm_service.analyze_emotion(
-            document_id=request.document_id
+            document_id=request.document_id,
+            document=document
         )
         return response
     except HTTPException:
@@ -234,17 +313,14 @@ async def analyze_emotion(
 @app.delete("/documents/{document_id}")
 async def delete_document(
     document_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    authorized: Tuple[Dict[str, Any], Document] = Depends(owned_document)
 ):
     """Delete a document (requires authentication and ownership)"""
     try:
-        user_id = current_user["uid"]
-
-        # Validate document ownership
-        await validate_document_ownership(document_id, user_id)
-
+        # Ownership was validated alongside token verification;
+        # DocumentService deletes through the shared storage service
         await document_service.delete_document(document_id)
-        await storage_service.delete_document(document_id)
+        llm_service.forget_document(document_id)
         return {"status": "success", "message": f"Document {document_id} deleted"}
     except HTTPException:
         raise
@@ -5,30 +5,37 @@ Enhanced TalkToYourDocument API with all improvements implemented
 
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import Response
 from typing import List, Optional, Dict, Any
 import tempfile
 import os
-import uuid
+import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from contextlib import asynccontextmanager
 
 # Models
+from responses import ORJSONResponse, listing_etag, not_modified, weak_etag
 from models import (
-    Document, QueryRequest, QueryResponse, 
+    Document, DocumentMeta, DocumentMetaListAdapter, QueryRequest, QueryResponse, 
     SummaryRequest, SummaryResponse,
     EmotionRequest, EmotionResponse,
     User
 )
 
 # Enhanced services
-from services.enhanced_document_service import EnhancedDocumentService
+from services.enhanced_document_service import (
+    EnhancedDocumentService, MAX_UPLOAD_BYTES, decode_page_cursor, encode_page_cursor
+)
 from services.llm_service import LLMService
 from services.database_service import DatabaseService
 from services.cache_service import cache_service
+from services.semantic_cache import semantic_cache
 from services.rate_limiter import rate_limiter, RateLimitMiddleware, rate_limit_dependency
 from services.secret_manager import secret_manager, validate_required_secrets
+from services.firebase_auth_service import firebase_auth_service
+from services.executors import shutdown_cpu_executor
+from services.upload_limits import BodySizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES
 
 # Auth
 from auth.dependencies import get_current_user, get_current_user_optional, get_user_uid
@@ -44,6 +51,31 @@ logger = logging.getLogger(__name__)
 document_service = None
 llm_service = None
 
+def fast_id() -> str:
+    """Random 128-bit hex identifier without constructing a UUID object"""
+    return os.urandom(16).hex()
+
+def rate_limit(limit_type: str):
+    """Build a named rate-limit dependency for ``limit_type``"""
+    async def dependency(
+        request: Request,
+        user: Optional[User] = Depends(get_current_user_optional)
+    ):
+        return await rate_limit_dependency(request, limit_type, user.uid if user else None)
+    dependency.__name__ = f"rate_limit_{limit_type}"
+    return dependency
+
+# Built once at import so every route shares the same dependency callables
+upload_rate_limit = rate_limit("upload")
+global_rate_limit = rate_limit("global")
+ai_query_rate_limit = rate_limit("ai_query")
+
+async def _refresh_clock(app: FastAPI):
+    """Keep a cached ISO timestamp on app.state for hot read-only endpoints"""
+    while True:
+        app.state.now_iso = datetime.now(timezone.utc).isoformat()
+        await asyncio.sleep(1)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -51,6 +83,9 @@ async def lifespan(app: FastAPI):
     
     logger.info("🚀 Starting TalkToYourDocument API...")
     
+    app.state.now_iso = datetime.now(timezone.utc).isoformat()
+    clock_task = asyncio.create_task(_refresh_clock(app))
+    
     try:
         # Validate secrets
         secret_validation = validate_required_secrets()
@@ -71,6 +106,9 @@ async def lifespan(app: FastAPI):
         llm_service = LLMService()
         logger.info("✅ LLM service initialized")
         
+        # Pre-fetch Firebase signing keys so the first authenticated requests don't race for them
+        await firebase_auth_service.warm_up()
+        
         logger.info("🎉 All services initialized successfully!")
         
         yield
@@ -80,6 +118,8 @@ async def lifespan(app: FastAPI):
         raise
     
     finally:
+        clock_task.cancel()
+        shutdown_cpu_executor()
         logger.info("🛑 Shutting down TalkToYourDocument API...")
 
 # Create FastAPI app with lifespan
@@ -87,41 +127,54 @@ app = FastAPI(
     title="TalkToYourDocument API",
     description="AI-powered document analysis platform with real-time processing",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+
+# Oversized uploads get a 413 before their body is read (innermost, so rate limiting runs first)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES,
+    paths=["/upload"]
 )
 
 # Add rate limiting middleware
 app.add_middleware(RateLimitMiddleware)
 
+# Explicit comma-separated origins (CORS_ORIGINS) allow preflight caching; "*" keeps the old behaviour
+CORS_ORIGINS = [origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()]
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],  # listing pagination
+    max_age=86400,  # let browsers cache preflight responses for a day
 )
 
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Global exception: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
             "message": "An unexpected error occurred",
-            "request_id": str(uuid.uuid4())
+            "request_id": fast_id()
         }
     )
 
 # Health check endpoints
 @app.get("/")
-async def health_check():
+async def health_check(request: Request):
     """Enhanced health check with service status"""
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": request.app.state.now_iso,
         "version": "2.0.0",
         "services": {
             "database": document_service.database.get_database_type() if document_service else "not_initialized",
@@ -131,27 +184,34 @@ async def health_check():
     }
 
 @app.get("/health/detailed")
-async def detailed_health_check():
+async def detailed_health_check(request: Request):
     """Detailed health check for monitoring"""
-    try:
-        # Test database
-        db_status = "healthy"
+    async def check_database() -> str:
         try:
             await document_service.database.list_documents(limit=1)
+            return "healthy"
         except Exception as e:
-            db_status = f"error: {str(e)}"
-        
-        # Test cache
-        cache_status = "healthy"
+            return f"error: {str(e)}"
+    
+    async def check_cache() -> str:
         try:
             await cache_service.set("health_check", "ok", ttl=60)
             await cache_service.get("health_check")
+            return "healthy"
         except Exception as e:
-            cache_status = f"error: {str(e)}"
+            return f"error: {str(e)}"
+    
+    try:
+        # Database and cache checks are independent, so run them concurrently
+        async with asyncio.TaskGroup() as tg:
+            db_task = tg.create_task(check_database())
+            cache_task = tg.create_task(check_cache())
+        db_status = db_task.result()
+        cache_status = cache_task.result()
         
         return {
             "status": "healthy",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": request.app.state.now_iso,
             "services": {
                 "database": db_status,
                 "cache": cache_status,
@@ -163,12 +223,12 @@ async def detailed_health_check():
             }
         }
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
                 "error": str(e),
-                "timestamp": datetime.utcnow().isoformat()
+                "timestamp": request.app.state.now_iso
             }
         )
 
@@ -184,12 +244,13 @@ async def upload_document(
     request: Request,
     file: UploadFile = File(...),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "upload", u.uid if u else None))
+    _rate_limit: Any = Depends(upload_rate_limit)
 ):
     """Upload and process a document with rate limiting"""
     try:
         user_id = current_user.uid if current_user else None
         document = await document_service.upload_and_process_document(file, user_id)
+        await llm_service.index_document(document)
         
         logger.info(f"Document uploaded: {document.document_id} by user: {user_id}")
         return document
@@ -200,37 +261,56 @@ async def upload_document(
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail="Upload failed")
 
-@app.get("/documents", response_model=List[Document])
+@app.get("/documents", response_model=List[DocumentMeta])
 async def list_documents(
     request: Request,
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, max_length=512),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "global", u.uid if u else None))
+    _rate_limit: Any = Depends(global_rate_limit)
 ):
-    """List documents with pagination"""
+    """
+    List documents newest first; X-Total-Count carries the total and X-Next-Cursor,
+    passed back as ``cursor``, fetches the next page
+    """
+    if cursor is not None and decode_page_cursor(cursor) is None:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
     try:
         user_id = current_user.uid if current_user else None
-        documents = await document_service.list_documents(user_id, limit, offset)
-        return documents
+        documents, total = await document_service.list_documents(user_id, limit, cursor)
+        
+        # Pollers with an up-to-date listing get a 304 without a body
+        etag = weak_etag(listing_etag(documents), total)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        headers = {"ETag": etag, "X-Total-Count": str(total)}
+        if len(documents) == limit:
+            headers["X-Next-Cursor"] = encode_page_cursor(documents[-1])
+        return Response(
+            DocumentMetaListAdapter.dump_json(documents),
+            media_type="application/json",
+            headers=headers
+        )
         
     except Exception as e:
         logger.error(f"List documents error: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to list documents")
 
-@app.get("/documents/search", response_model=List[Document])
+@app.get("/documents/search", response_model=List[DocumentMeta])
 async def search_documents(
     request: Request,
     q: str = Query(..., min_length=1, max_length=500),
     limit: int = Query(50, ge=1, le=100),
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "global", u.uid if u else None))
+    _rate_limit: Any = Depends(global_rate_limit)
 ):
     """Search documents with full-text search"""
     try:
         user_id = current_user.uid if current_user else None
         documents = await document_service.search_documents(q, user_id, limit)
-        return documents
+        return Response(DocumentMetaListAdapter.dump_json(documents), media_type="application/json")
         
     except Exception as e:
         logger.error(f"Search error: {str(e)}")
@@ -240,7 +320,7 @@ async def search_documents(
 async def get_document_statistics(
     request: Request,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "global", u.uid if u else None))
+    _rate_limit: Any = Depends(global_rate_limit)
 ):
     """Get document statistics"""
     try:
@@ -257,7 +337,7 @@ async def delete_document(
     request: Request,
     document_id: str,
     current_user: User = Depends(get_current_user),
-    _rate_limit: Any = Depends(lambda r, u: rate_limit_dependency(r, "global", u.uid))
+    _rate_limit: Any = Depends(global_rate_limit)
 ):
     """Delete a document (requires authentication)"""
     try:
@@ -265,6 +345,7 @@ async def delete_document(
         if not success:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        llm_service.forget_document(document_id)
         return {"status": "success", "message": f"Document {document_id} deleted"}
         
     except HTTPException:
@@ -279,7 +360,7 @@ async def query_document(
     request: Request,
     query_request: QueryRequest,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "ai_query", u.uid if u else None))
+    _rate_limit: Any = Depends(ai_query_rate_limit)
 ):
     """Query document with AI (with caching and rate limiting)"""
     try:
@@ -290,9 +371,25 @@ async def query_document(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        # Serve paraphrases of earlier questions from the semantic cache;
+        # answers that depend on prior chat turns are never shared
+        cache_parts = (
+            query_request.document_id,
+            query_request.target_language.value,
+            query_request.include_emotion
+        )
+        use_semantic_cache = not query_request.chat_history
+        if use_semantic_cache:
+            cached = await semantic_cache.lookup("query", cache_parts, query_request.query)
+            if cached:
+                return QueryResponse(**cached)
+        
         # Process AI query with caching
         response = await llm_service.query_document(query_request)
         
+        if use_semantic_cache:
+            await semantic_cache.store("query", cache_parts, response.model_dump(), query_request.query)
+        
         logger.info(f"AI query processed for document: {query_request.document_id}")
         return response
         
@@ -307,7 +404,7 @@ async def summarize_document(
     request: Request,
     summary_request: SummaryRequest,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "ai_query", u.uid if u else None))
+    _rate_limit: Any = Depends(ai_query_rate_limit)
 ):
     """Generate document summary with AI"""
     try:
@@ -317,7 +414,19 @@ async def summarize_document(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        cache_parts = (
+            summary_request.document_id,
+            summary_request.target_language.value,
+            summary_request.max_length,
+            summary_request.include_key_points
+        )
+        # No free text to compare: an exact-key cache on the request parameters
+        cached = await semantic_cache.lookup("summary", cache_parts)
+        if cached:
+            return SummaryResponse(**cached)
+        
         response = await llm_service.summarize_document(summary_request)
+        await semantic_cache.store("summary", cache_parts, response.model_dump())
         return response
         
     except HTTPException:
@@ -331,7 +440,7 @@ async def analyze_emotion(
     request: Request,
     emotion_request: EmotionRequest,
     current_user: Optional[User] = Depends(get_current_user_optional),
-    _rate_limit: Any = Depends(lambda r, u=None: rate_limit_dependency(r, "ai_query", u.uid if u else None))
+    _rate_limit: Any = Depends(ai_query_rate_limit)
 ):
     """Analyze document emotion with AI"""
     try:
@@ -341,7 +450,18 @@ async def analyze_emotion(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
+        cache_parts = (
+            emotion_request.document_id,
+            emotion_request.target_language.value,
+            emotion_request.include_breakdown
+        )
+        # No free text to compare: an exact-key cache on the request parameters
+        cached = await semantic_cache.lookup("emotion", cache_parts)
+        if cached:
+            return EmotionResponse(**cached)
+        
         response = await llm_service.analyze_emotion(emotion_request)
+        await semantic_cache.store("emotion", cache_parts, response.model_dump())
         return response
         
     except HTTPException:
@@ -1,8 +1,12 @@
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
+from typing import Optional
+from datetime import datetime, timezone
 from enum import Enum
 
+def utcnow() -> datetime:
+    """Naive UTC now without the deprecated datetime.utcnow()"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class Language(str, Enum):
     ENGLISH = "en"
     TELUGU = "te"
@@ -11,67 +15,83 @@ class Language(str, Enum):
     FRENCH = "fr"
     GERMAN = "de"
 
-class User(BaseModel):
+class APIModel(BaseModel):
+    """Shared Pydantic v2 configuration for API models"""
+    model_config = ConfigDict(
+        frozen=False,
+        extra="ignore",
+        arbitrary_types_allowed=False,
+        ser_json_timedelta="iso8601"
+    )
+
+class User(APIModel):
     uid: str
     email: Optional[str] = None
     email_verified: bool = False
     name: Optional[str] = None
     picture: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = Field(default_factory=utcnow)
 
-class ChatMessage(BaseModel):
+class ChatMessage(APIModel):
     role: str  # "user" or "assistant"
     content: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=utcnow)
     language: Language = Language.ENGLISH
 
-class Document(BaseModel):
+class DocumentMeta(APIModel):
+    """Document listing row: everything except the text and chat history"""
     document_id: str
     filename: str
     title: str
-    text: str
     user_id: Optional[str] = None  # Firebase UID of document owner
-    meta: Dict = Field(default_factory=dict)
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
-    chat_history: List[ChatMessage] = Field(default_factory=list)
+    meta: dict = Field(default_factory=dict)
+    created_at: datetime = Field(default_factory=utcnow)
+    updated_at: datetime = Field(default_factory=utcnow)
     detected_language: Language = Language.ENGLISH
 
-class QueryRequest(BaseModel):
+class Document(DocumentMeta):
+    text: str
+    chat_history: list[ChatMessage] = Field(default_factory=list)
+
+class QueryRequest(APIModel):
     document_id: str
     query: str
     query_language: Language = Language.ENGLISH
     target_language: Language = Language.ENGLISH
     include_emotion: bool = False
-    chat_history: Optional[List[ChatMessage]] = None
+    chat_history: Optional[list[ChatMessage]] = None
 
-class SummaryRequest(BaseModel):
+class SummaryRequest(APIModel):
     document_id: str
     target_language: Language = Language.ENGLISH
     max_length: Optional[int] = None
     include_key_points: bool = True
 
-class EmotionRequest(BaseModel):
+class EmotionRequest(APIModel):
     document_id: str
     include_breakdown: bool = True
     target_language: Language = Language.ENGLISH
 
-class EmotionResponse(BaseModel):
+class EmotionResponse(APIModel):
     primary_emotion: str
-    emotion_breakdown: Dict[str, float]
+    emotion_breakdown: dict[str, float]
     reasoning: str
     language: Language
 
-class QueryResponse(BaseModel):
+class QueryResponse(APIModel):
     answer: str
     confidence: float
     emotion: Optional[EmotionResponse] = None
     source_text: Optional[str] = None
     language: Language
-    chat_history: List[ChatMessage]
+    chat_history: list[ChatMessage]
 
-class SummaryResponse(BaseModel):
+class SummaryResponse(APIModel):
     summary: str
-    key_points: List[str]
+    key_points: list[str]
     word_count: int
-    language: Language
\ No newline at end of file
+    language: Language
+
+# Serializes document listings straight to JSON bytes, skipping per-item re-validation.
+# Full Document instances are dumped as DocumentMeta, so text never reaches the wire.
+DocumentMetaListAdapter = TypeAdapter(list[DocumentMeta])
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Fast JSON response class and conditional-request helpers shared by the FastAPI apps
+"""
+
+import hashlib
+from typing import Any, Iterable, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson, falling back to the stdlib encoder"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if not ORJSON_AVAILABLE:
+            return super().render(content)
+        return orjson.dumps(
+            content,
+            default=str,
+            option=orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+def weak_etag(*parts: Any) -> str:
+    """Weak ETag over the given version parts (non-cryptographic, so blake2b)"""
+    digest = hashlib.blake2b("|".join(str(part) for part in parts).encode(), digest_size=8).hexdigest()
+    return f'W/"{digest}"'
+
+def listing_etag(documents: Iterable[Any]) -> str:
+    """ETag for a document listing; changes on any add, delete or update"""
+    documents = list(documents)
+    latest = max((doc.updated_at for doc in documents), default="")
+    return weak_etag(len(documents), latest, *(doc.document_id for doc in documents))
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """Return a bodiless 304 if the client's If-None-Match covers ``etag``, else None"""
+    header = request.headers.get("if-none-match")
+    if header and (header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
@@ -4,9 +4,9 @@ Test runner for TalkToYourDocument API
 Runs unit tests, integration tests, and provides a comprehensive test report
 """
 
-import subprocess
-import sys
+import asyncio
 import os
+import sys
 import time
 import argparse
 from pathlib import Path
@@ -14,41 +14,90 @@ from pathlib import Path
 class TestRunner:
     """Test runner for the API"""
     
-    def __init__(self, api_url="http://localhost:8000"):
+    PYTEST_ARGS = ["test_api.py", "test_storage_service.py", "-v", "--tb=short"]
+    
+    def __init__(self, api_url="http://localhost:8000", in_process=False):
         self.api_url = api_url
+        self.in_process = in_process
         self.test_results = {}
+        self._client = None
+    
+    def _get_client(self):
+        """Shared keep-alive HTTP client for all API probes"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                timeout=10,
+                limits=httpx.Limits(max_keepalive_connections=8)
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close the shared HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    def run_unit_tests(self):
+    async def _stream(self, stream, console, prefix):
+        """Echo a subprocess pipe line by line as it arrives and return everything read"""
+        lines = []
+        async for raw in stream:
+            line = raw.decode(errors="replace")
+            console.write(f"{prefix}{line}")
+            console.flush()
+            lines.append(line)
+        return "".join(lines)
+    
+    async def _run_command(self, args, timeout, prefix=""):
+        """Run a command without blocking the event loop, streaming its output live; returns (returncode, stdout, stderr)"""
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr, _ = await asyncio.wait_for(
+                asyncio.gather(
+                    self._stream(process.stdout, sys.stdout, prefix),
+                    self._stream(process.stderr, sys.stderr, prefix),
+                    process.wait()
+                ),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        return process.returncode, stdout, stderr
+    
+    async def run_unit_tests(self):
         """Run unit tests using pytest"""
         print("🧪 Running Unit Tests...")
         print("=" * 50)
         
         try:
-            # Run pytest with verbose output
-            result = subprocess.run([
-                sys.executable, "-m", "pytest", 
-                "test_api.py", 
-                "test_storage_service.py",
-                "-v", 
-                "--tb=short"
-            ], capture_output=True, text=True, timeout=300)
-            
-            print(result.stdout)
-            if result.stderr:
-                print("STDERR:", result.stderr)
+            if self.in_process:
+                returncode, stdout, stderr = await self._run_pytest_in_process()
+            else:
+                # Run pytest with verbose output in a clean interpreter
+                returncode, stdout, stderr = await self._run_command(
+                    [sys.executable, "-m", "pytest", *self.PYTEST_ARGS],
+                    timeout=300, prefix="[unit] "
+                )
             
             self.test_results['unit_tests'] = {
-                'success': result.returncode == 0,
-                'output': result.stdout,
-                'errors': result.stderr
+                'success': returncode == 0,
+                'output': stdout,
+                'errors': stderr
             }
             
-            if result.returncode == 0:
+            if returncode == 0:
                 print("✅ Unit tests passed!")
             else:
                 print("❌ Unit tests failed!")
                 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             print("❌ Unit tests timed out!")
             self.test_results['unit_tests'] = {
                 'success': False,
@@ -63,13 +112,42 @@ class TestRunner:
                 'errors': str(e)
             }
     
-    def check_api_running(self):
+    async def _run_pytest_in_process(self):
+        """Run pytest in this (already warm) interpreter; returns (returncode, output, errors)"""
+        try:
+            import pytest
+        except ImportError:
+            print("STDERR: pytest is not installed")
+            return 1, "", "pytest is not installed"
+        
+        # Only used when the unit suite runs alone, so pytest can own the console and its
+        # fd-level capture; a running pytest.main can't be interrupted, so there is no timeout
+        returncode = pytest.main(list(self.PYTEST_ARGS))
+        return int(returncode), f"pytest exited with code {int(returncode)}", ""
+    
+    async def _api_responds(self, timeout=10):
+        """Return True if the health endpoint answers 200 (no output)"""
+        try:
+            response = await self._get_client().get("/", timeout=timeout)
+            return response.status_code == 200
+        except Exception:
+            return False
+    
+    async def wait_for_api(self, timeout=10, interval=0.1):
+        """Poll the health endpoint until it answers or ``timeout`` seconds pass"""
+        started = time.monotonic()
+        while time.monotonic() - started < timeout:
+            if await self._api_responds(1):
+                return True
+            await asyncio.sleep(interval)
+        return False
+    
+    async def check_api_running(self):
         """Check if the API is running"""
         print(f"🔍 Checking if API is running at {self.api_url}...")
         
         try:
-            import requests
-            response = requests.get(f"{self.api_url}/", timeout=10)
+            response = await self._get_client().get("/")
             if response.status_code == 200:
                 print("✅ API is running!")
                 return True
@@ -80,7 +158,7 @@ class TestRunner:
             print(f"❌ API is not accessible: {e}")
             return False
     
-    def start_api_server(self):
+    async def start_api_server(self):
         """Start the API server for testing"""
         print("🚀 Starting API server...")
         
@@ -90,41 +168,43 @@ class TestRunner:
                 print("❌ main.py not found!")
                 return None
             
-            # Start the server
-            process = subprocess.Popen([
+            # Start the server (output discarded so an unread pipe can't stall it)
+            process = await asyncio.create_subprocess_exec(
                 sys.executable, "-m", "uvicorn", 
                 "main:app", 
                 "--host", "0.0.0.0", 
                 "--port", "8000",
-                "--reload"
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                "--reload",
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
             
-            # Wait a bit for the server to start
-            time.sleep(5)
-            
-            # Check if it's running
-            if self.check_api_running():
+            # Poll until the server answers instead of sleeping a fixed time
+            if await self.wait_for_api():
+                print("✅ API is running!")
                 return process
             else:
+                print("❌ API did not become ready in time")
                 process.terminate()
+                await process.wait()
                 return None
                 
         except Exception as e:
             print(f"❌ Error starting API server: {e}")
             return None
     
-    def run_integration_tests(self):
+    async def run_integration_tests(self):
         """Run integration tests"""
         print("🌐 Running Integration Tests...")
         print("=" * 50)
         
         # Check if API is running
-        api_running = self.check_api_running()
+        api_running = await self.check_api_running()
         server_process = None
         
         if not api_running:
             print("API not running, attempting to start it...")
-            server_process = self.start_api_server()
+            server_process = await self.start_api_server()
             if not server_process:
                 print("❌ Could not start API server for integration tests")
                 self.test_results['integration_tests'] = {
@@ -136,27 +216,23 @@ class TestRunner:
         
         try:
             # Run integration tests
-            result = subprocess.run([
+            returncode, stdout, stderr = await self._run_command([
                 sys.executable, "test_integration.py", 
                 "--url", self.api_url
-            ], capture_output=True, text=True, timeout=600)
-            
-            print(result.stdout)
-            if result.stderr:
-                print("STDERR:", result.stderr)
+            ], timeout=600, prefix="[integration] ")
             
             self.test_results['integration_tests'] = {
-                'success': result.returncode == 0,
-                'output': result.stdout,
-                'errors': result.stderr
+                'success': returncode == 0,
+                'output': stdout,
+                'errors': stderr
             }
             
-            if result.returncode == 0:
+            if returncode == 0:
                 print("✅ Integration tests passed!")
             else:
                 print("❌ Integration tests failed!")
                 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
             print("❌ Integration tests timed out!")
             self.test_results['integration_tests'] = {
                 'success': False,
@@ -176,56 +252,46 @@ class TestRunner:
                 print("🛑 Stopping test server...")
                 server_process.terminate()
                 try:
-                    server_process.wait(timeout=10)
-                except subprocess.TimeoutExpired:
+                    await asyncio.wait_for(server_process.wait(), timeout=10)
+                except asyncio.TimeoutError:
                     server_process.kill()
+                    await server_process.wait()
     
-    def run_simple_api_test(self):
+    async def run_simple_api_test(self):
         """Run a simple API test without the full integration suite"""
         print("🔧 Running Simple API Test...")
         print("=" * 50)
         
         try:
-            import requests
-            import tempfile
+            client = self._get_client()
             
             # Test health endpoint
             print("Testing health endpoint...")
-            response = requests.get(f"{self.api_url}/")
+            response = await client.get("/")
             assert response.status_code == 200
             print("✅ Health check passed")
             
             # Test document upload (if possible)
             print("Testing document upload...")
-            test_content = "This is a test document for API testing."
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
-                f.write(test_content)
-                temp_file_path = f.name
+            test_content = b"This is a test document for API testing."
+            files = {'file': ('test.txt', test_content, 'text/plain')}
+            response = await client.post("/upload", files=files)
             
-            try:
-                with open(temp_file_path, 'rb') as f:
-                    files = {'file': ('test.txt', f, 'text/plain')}
-                    response = requests.post(f"{self.api_url}/upload", files=files)
+            if response.status_code == 200:
+                print("✅ Document upload passed")
+                doc_data = response.json()
+                doc_id = doc_data.get('document_id')
                 
-                if response.status_code == 200:
-                    print("✅ Document upload passed")
-                    doc_data = response.json()
-                    doc_id = doc_data.get('document_id')
-                    
-                    # Test document listing
-                    print("Testing document listing...")
-                    response = requests.get(f"{self.api_url}/documents")
-                    if response.status_code in [200, 401]:  # 401 is expected if auth required
-                        print("✅ Document listing endpoint accessible")
-                    
-                elif response.status_code == 401:
-                    print("ℹ️ Upload requires authentication (expected)")
-                else:
-                    print(f"⚠️ Upload failed: {response.status_code}")
-                    
-            finally:
-                os.unlink(temp_file_path)
+                # Test document listing
+                print("Testing document listing...")
+                response = await client.get("/documents")
+                if response.status_code in [200, 401]:  # 401 is expected if auth required
+                    print("✅ Document listing endpoint accessible")
+                
+            elif response.status_code == 401:
+                print("ℹ️ Upload requires authentication (expected)")
+            else:
+                print(f"⚠️ Upload failed: {response.status_code}")
             
             self.test_results['simple_api_test'] = {
                 'success': True,
@@ -269,27 +335,40 @@ class TestRunner:
             print("⚠️ Some test suites failed!")
             return False
     
-    def run_all_tests(self, skip_integration=False):
-        """Run all available tests"""
+    async def run_all_tests_async(self, skip_integration=False):
+        """Run all available tests, overlapping unit and integration suites"""
         print("🚀 Starting TalkToYourDocument API Test Suite")
         print(f"🌐 API URL: {self.api_url}")
         print("=" * 60)
         
-        # Run unit tests
-        self.run_unit_tests()
-        
-        # Run integration tests or simple API test
+        # In-process pytest swaps the process-wide stdout/stderr fds for capture, which
+        # would swallow or break the integration suite's output; use a subprocess then
         if not skip_integration:
-            if self.check_api_running():
-                self.run_integration_tests()
+            self.in_process = False
+        
+        suites = [self.run_unit_tests()]
+        
+        try:
+            # Run integration tests or simple API test alongside the unit tests
+            if not skip_integration:
+                if await self.check_api_running():
+                    suites.append(self.run_integration_tests())
+                else:
+                    print("⚠️ API not running, running simple test instead")
+                    suites.append(self.run_simple_api_test())
             else:
-                print("⚠️ API not running, running simple test instead")
-                self.run_simple_api_test()
-        else:
-            print("⏭️ Skipping integration tests")
+                print("⏭️ Skipping integration tests")
+            
+            await asyncio.gather(*suites)
+        finally:
+            await self.aclose()
         
         # Generate report
         return self.generate_report()
+    
+    def run_all_tests(self, skip_integration=False):
+        """Run all available tests"""
+        return asyncio.run(self.run_all_tests_async(skip_integration))
 
 def main():
     """Main function"""
@@ -300,13 +379,17 @@ def main():
                        help='Skip integration tests')
     parser.add_argument('--unit-only', action='store_true',
                        help='Run only unit tests')
+    parser.add_argument('--in-process', action=argparse.BooleanOptionalAction,
+                       default=not os.getenv('CI'),
+                       help='Run pytest inside this interpreter when unit tests run alone '
+                            '(--unit-only or --skip-integration; default unless CI is set)')
     
     args = parser.parse_args()
     
-    runner = TestRunner(args.url)
+    runner = TestRunner(args.url, in_process=args.in_process)
     
     if args.unit_only:
-        runner.run_unit_tests()
+        asyncio.run(runner.run_unit_tests())
         success = runner.test_results.get('unit_tests', {}).get('success', False)
     else:
         success = runner.run_all_tests(args.skip_integration)
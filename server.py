@@ -1,19 +1,39 @@
+import asyncio
+import functools
 import grpc
 import hello_pb2
 import hello_pb2_grpc
-from concurrent import futures
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+SERVER_OPTIONS = [
+    ("grpc.so_reuseport", 1),
+    ("grpc.max_concurrent_streams", 1000),
+    ("grpc.keepalive_time_ms", 30000),
+]
+
+@functools.lru_cache(maxsize=2048)
+def _reply_for(name):
+    # Shared across RPCs: grpc only serializes the reply, so it must never be mutated
+    return hello_pb2.HelloReply(message=f"Hello, {name}!")
 
 class GreeterService(hello_pb2_grpc.GreeterServicer):
-    def SayHello(self, request, context):
-        return hello_pb2.HelloReply(message=f"Hello, {request.name}!")
+    async def SayHello(self, request, context):
+        return _reply_for(request.name)
 
-def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+async def serve():
+    # RPCs are multiplexed on the event loop instead of one thread each
+    server = grpc.aio.server(options=SERVER_OPTIONS)
     hello_pb2_grpc.add_GreeterServicer_to_server(GreeterService(), server)
     server.add_insecure_port("[::]:50051")
-    server.start()
+    await server.start()
     print("Server running on port 50051...")
-    server.wait_for_termination()
+    await server.wait_for_termination()
 
 if __name__ == "__main__":
-    serve()
+    if uvloop is not None:
+        uvloop.install()
+    asyncio.run(serve())
@@ -5,10 +5,13 @@ Caching service with Redis primary and in-memory fallback
 
 import os
 import json
+import time
+import heapq
 import hashlib
 import logging
-from typing import Any, Optional, Dict, Union
-from datetime import datetime, timedelta
+import functools
+from typing import Any, Awaitable, Callable, Optional, Dict, List, Tuple, Union
+from collections import OrderedDict
 import asyncio
 
 try:
@@ -18,15 +21,89 @@ except ImportError:
     REDIS_AVAILABLE = False
     redis = None
 
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+    xxhash = None
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+try:
+    import zstandard as zstd
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+    zstd = None
+
+def _dumps(value: Any, sort_keys: bool = False) -> bytes:
+    """Serialize a cache value to compact UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, default=str, option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return json.dumps(value, default=str, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False).encode()
+
+def _loads(value: Union[bytes, str]) -> Any:
+    """Deserialize JSON bytes (or str) from the cache"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(value)
+    return json.loads(value)
+
+# Redis payloads larger than this are zstd-compressed (0 disables compression)
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "512"))
+
+# Every zstd frame starts with this magic number; JSON never does, so no extra marker is needed
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+_compressor = zstd.ZstdCompressor(level=3) if ZSTD_AVAILABLE else None
+_decompressor = zstd.ZstdDecompressor() if ZSTD_AVAILABLE else None
+
+def _encode(value: Any) -> bytes:
+    """Serialize a value for Redis, compressing large payloads"""
+    blob = _dumps(value)
+    if ZSTD_AVAILABLE and CACHE_COMPRESS_MIN_BYTES and len(blob) > CACHE_COMPRESS_MIN_BYTES:
+        return _compressor.compress(blob)
+    return blob
+
+def _decode(blob: bytes) -> Any:
+    """Inverse of _encode; plain JSON written before compression was enabled still loads"""
+    if blob.startswith(ZSTD_MAGIC):
+        if not ZSTD_AVAILABLE:
+            raise ValueError("Compressed cache entry but zstandard is not installed")
+        blob = _decompressor.decompress(blob)
+    return _loads(blob)
+
 from services.secret_manager import get_redis_url
 
 logger = logging.getLogger(__name__)
 
+# Upper bound on fallback cache entries; least recently used entries are evicted beyond it
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv("MEMORY_CACHE_MAX_ENTRIES", "10000"))
+
+# Per-process L1 in front of Redis for read-heavy keys (summaries, sessions)
+CACHE_L1_MAX = int(os.getenv("CACHE_L1_MAX", "4096"))
+CACHE_L1_TTL = int(os.getenv("CACHE_L1_TTL", "30"))  # bounds staleness across workers
+
+# Redis connection pool size per process
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "64"))
+
 class InMemoryCache:
-    """Simple in-memory cache with TTL support"""
+    """Simple in-memory LRU cache with TTL support"""
     
-    def __init__(self):
-        self._cache: Dict[str, Dict[str, Any]] = {}
+    # Longest the cleanup task sleeps, so entries added while it waits are still reaped
+    MAX_CLEANUP_INTERVAL = 300
+    
+    def __init__(self, max_size: int = MEMORY_CACHE_MAX_ENTRIES):
+        # key -> (value, monotonic deadline), ordered from least to most recently used
+        self._cache: OrderedDict[str, Tuple[Any, float]] = OrderedDict()
+        # (deadline, key) min-heap; entries may be stale and are skipped lazily
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.max_size = max_size
         self._cleanup_task = None
         
     async def initialize(self):
@@ -36,22 +113,25 @@ class InMemoryCache:
     
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if key in self._cache:
-            entry = self._cache[key]
-            if entry['expires_at'] > datetime.utcnow():
-                return entry['value']
-            else:
-                del self._cache[key]
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at > time.monotonic():
+            self._cache.move_to_end(key)
+            return value
+        del self._cache[key]
         return None
     
     async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Set value in cache with TTL"""
         try:
-            expires_at = datetime.utcnow() + timedelta(seconds=ttl)
-            self._cache[key] = {
-                'value': value,
-                'expires_at': expires_at
-            }
+            expires_at = time.monotonic() + ttl
+            self._cache[key] = (value, expires_at)
+            self._cache.move_to_end(key)
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
             return True
         except Exception as e:
             logger.error(f"Failed to set cache key '{key}': {str(e)}")
@@ -64,28 +144,105 @@ class InMemoryCache:
             return True
         return False
     
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values; missing keys come back as None"""
+        return [await self.get(key) for key in keys]
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several values with the same TTL"""
+        for key, value in items.items():
+            await self.set(key, value, ttl)
+        return True
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete several keys, returning how many existed"""
+        return sum([await self.delete(key) for key in keys])
+    
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
-        return await self.get(key) is not None
+        entry = self._cache.get(key)
+        return entry is not None and entry[1] > time.monotonic()
+    
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """Check several keys; one bool per key"""
+        now = time.monotonic()
+        return [(entry := self._cache.get(key)) is not None and entry[1] > now for key in keys]
+    
+    async def set_indexed(self, key: str, value: Any, ttl: int, index_key: str) -> bool:
+        """Set a value and record its key in the set stored at ``index_key``"""
+        entry = self._cache.get(index_key)
+        members = entry[0] if entry is not None and entry[1] > time.monotonic() else set()
+        members.add(key)
+        return await self.set(key, value, ttl) and await self.set(index_key, members, ttl)
+    
+    async def delete_indexed(self, index_key: str) -> int:
+        """Delete every key recorded in ``index_key`` and the index itself"""
+        entry = self._cache.pop(index_key, None)
+        if entry is None:
+            return 0
+        return await self.delete_many(list(entry[0]))
+    
+    async def append_capped(self, key: str, value: Any, max_len: int, ttl: int) -> bool:
+        """Append to the list at ``key``, keeping only its newest ``max_len`` items"""
+        # No await between read and write, so concurrent appends can't lose each other
+        entry = self._cache.get(key)
+        items = list(entry[0]) if entry is not None and entry[1] > time.monotonic() else []
+        items.append(value)
+        return await self.set(key, items[-max_len:], ttl)
+    
+    async def get_list(self, key: str) -> List[Any]:
+        """Items of the list at ``key``, oldest first (empty when missing)"""
+        return list(await self.get(key) or [])
+    
+    async def increment_window(self, key: str, ttl: int) -> int:
+        """Increment a fixed-window counter, starting its TTL on first use"""
+        # No await between read and write, so concurrent coroutines can't interleave here
+        now = time.monotonic()
+        entry = self._cache.get(key)
+        if entry is None or entry[1] <= now:
+            count, expires_at = 1, now + ttl
+            heapq.heappush(self._expiry_heap, (expires_at, key))
+        else:
+            count, expires_at = entry[0] + 1, entry[1]
+        self._cache[key] = (count, expires_at)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return count
     
     async def clear(self) -> bool:
         """Clear all cache entries"""
         self._cache.clear()
+        self._expiry_heap.clear()
         return True
     
+    def _evict_expired(self) -> float:
+        """Drop entries whose deadline has passed; returns seconds until the next one expires"""
+        now = time.monotonic()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            expires_at, key = heapq.heappop(heap)
+            entry = self._cache.get(key)
+            # Skip heap records superseded by a later set() or already evicted
+            if entry is not None and entry[1] == expires_at:
+                del self._cache[key]
+        # Stale records for evicted/overwritten keys can pile up; rebuild when they dominate
+        if len(heap) > 2 * max(len(self._cache), 1024):
+            self._expiry_heap = [(exp, key) for key, (_, exp) in self._cache.items()]
+            heapq.heapify(self._expiry_heap)
+            heap = self._expiry_heap
+        if not heap:
+            return self.MAX_CLEANUP_INTERVAL
+        return min(self.MAX_CLEANUP_INTERVAL, max(1, heap[0][0] - now))
+    
     async def _cleanup_expired(self):
         """Background task to clean up expired entries"""
         while True:
             try:
-                current_time = datetime.utcnow()
-                expired_keys = [
-                    key for key, entry in self._cache.items()
-                    if entry['expires_at'] <= current_time
-                ]
-                for key in expired_keys:
-                    del self._cache[key]
-                
-                await asyncio.sleep(300)  # Clean up every 5 minutes
+                # Sleep until the earliest deadline instead of scanning on a fixed timer
+                await asyncio.sleep(self._evict_expired())
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 logger.error(f"Cache cleanup error: {str(e)}")
                 await asyncio.sleep(60)
@@ -93,9 +250,52 @@ class InMemoryCache:
 class RedisCache:
     """Redis-based cache implementation"""
     
+    # Atomic counter: INCR and set the expiry only when the key is created, in one round trip
+    INCR_WITH_EXPIRY_SCRIPT = """
+    local count = redis.call('INCR', KEYS[1])
+    if count == 1 then
+        redis.call('EXPIRE', KEYS[1], ARGV[1])
+    end
+    return count
+    """
+    
+    # Pub/sub channel carrying keys that in-process tiers (L1s) in other workers must drop
+    INVALIDATION_CHANNEL = "cache:invalidate"
+    
+    # Atomic value write plus secondary-index update (index lives as long as its newest member)
+    SET_WITH_INDEX_SCRIPT = """
+    redis.call('SETEX', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('SADD', KEYS[2], KEYS[1])
+    redis.call('EXPIRE', KEYS[2], ARGV[1])
+    return 1
+    """
+    
+    # Atomic capped list append: concurrent writers each keep their item
+    APPEND_CAPPED_SCRIPT = """
+    redis.call('RPUSH', KEYS[1], ARGV[3])
+    redis.call('LTRIM', KEYS[1], -tonumber(ARGV[1]), -1)
+    redis.call('EXPIRE', KEYS[1], ARGV[2])
+    return 1
+    """
+    
+    # Atomically delete every key recorded in an index set, then the index
+    DELETE_INDEXED_SCRIPT = """
+    local members = redis.call('SMEMBERS', KEYS[1])
+    local deleted = 0
+    for i = 1, #members, 1000 do
+        deleted = deleted + redis.call('DEL', unpack(members, i, math.min(i + 999, #members)))
+    end
+    redis.call('DEL', KEYS[1])
+    return deleted
+    """
+    
     def __init__(self):
         self.redis_url = get_redis_url() or os.getenv("REDIS_URL")
         self.client = None
+        self._incr_with_expiry = None
+        self._set_with_index = None
+        self._delete_indexed = None
+        self._append_capped = None
         
     async def initialize(self):
         """Initialize Redis connection"""
@@ -106,14 +306,21 @@ class RedisCache:
             self.client = redis.from_url(
                 self.redis_url,
                 encoding="utf-8",
-                decode_responses=True,
+                decode_responses=False,  # values are (possibly compressed) JSON bytes, see _decode
                 socket_timeout=5,
                 socket_connect_timeout=5,
-                retry_on_timeout=True
+                socket_keepalive=True,
+                retry_on_timeout=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                health_check_interval=30
             )
             
             # Test connection
             await self.client.ping()
+            self._incr_with_expiry = self.client.register_script(self.INCR_WITH_EXPIRY_SCRIPT)
+            self._set_with_index = self.client.register_script(self.SET_WITH_INDEX_SCRIPT)
+            self._delete_indexed = self.client.register_script(self.DELETE_INDEXED_SCRIPT)
+            self._append_capped = self.client.register_script(self.APPEND_CAPPED_SCRIPT)
             logger.info("Redis cache initialized successfully")
             
         except Exception as e:
@@ -125,7 +332,7 @@ class RedisCache:
         try:
             value = await self.client.get(key)
             if value:
-                return json.loads(value)
+                return _decode(value)
             return None
         except Exception as e:
             logger.error(f"Failed to get cache key '{key}': {str(e)}")
@@ -134,7 +341,7 @@ class RedisCache:
     async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Set value in Redis cache with TTL"""
         try:
-            serialized_value = json.dumps(value, default=str)
+            serialized_value = _encode(value)
             await self.client.setex(key, ttl, serialized_value)
             return True
         except Exception as e:
@@ -150,6 +357,41 @@ class RedisCache:
             logger.error(f"Failed to delete cache key '{key}': {str(e)}")
             return False
     
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values in one MGET round trip"""
+        if not keys:
+            return []
+        try:
+            values = await self.client.mget(keys)
+            return [_decode(value) if value else None for value in values]
+        except Exception as e:
+            logger.error(f"Failed to get {len(keys)} cache keys: {str(e)}")
+            return [None] * len(keys)
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several values with TTL in one pipelined round trip"""
+        if not items:
+            return True
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.setex(key, ttl, _encode(value))
+                await pipe.execute()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to set {len(items)} cache keys: {str(e)}")
+            return False
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete several keys with one DEL"""
+        if not keys:
+            return 0
+        try:
+            return await self.client.delete(*keys)
+        except Exception as e:
+            logger.error(f"Failed to delete {len(keys)} cache keys: {str(e)}")
+            return 0
+    
     async def exists(self, key: str) -> bool:
         """Check if key exists in Redis cache"""
         try:
@@ -159,6 +401,20 @@ class RedisCache:
             logger.error(f"Failed to check cache key '{key}': {str(e)}")
             return False
     
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """Check several keys with one pipelined round trip"""
+        if not keys:
+            return []
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.exists(key)
+                results = await pipe.execute()
+            return [result > 0 for result in results]
+        except Exception as e:
+            logger.error(f"Failed to check {len(keys)} cache keys: {str(e)}")
+            return [False] * len(keys)
+    
     async def clear(self) -> bool:
         """Clear all cache entries"""
         try:
@@ -179,34 +435,129 @@ class RedisCache:
         except Exception as e:
             logger.error(f"Failed to increment cache key '{key}': {str(e)}")
             return 0
+    
+    async def increment_window(self, key: str, ttl: int) -> int:
+        """Increment a fixed-window counter, starting its TTL on first use"""
+        try:
+            return int(await self._incr_with_expiry(keys=[key], args=[ttl]))
+        except Exception as e:
+            logger.error(f"Failed to increment window key '{key}': {str(e)}")
+            return 0
+    
+    async def set_indexed(self, key: str, value: Any, ttl: int, index_key: str) -> bool:
+        """Set a value and add its key to the index set in one atomic round trip"""
+        try:
+            await self._set_with_index(keys=[key, index_key], args=[ttl, _encode(value)])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to set indexed cache key '{key}': {str(e)}")
+            return False
+    
+    async def delete_indexed(self, index_key: str) -> int:
+        """Delete every key recorded in the index set, and the index itself"""
+        try:
+            return int(await self._delete_indexed(keys=[index_key]))
+        except Exception as e:
+            logger.error(f"Failed to delete indexed keys for '{index_key}': {str(e)}")
+            return 0
+    
+    async def append_capped(self, key: str, value: Any, max_len: int, ttl: int) -> bool:
+        """Append to the list at ``key`` and trim it to ``max_len`` items in one atomic round trip"""
+        try:
+            await self._append_capped(keys=[key], args=[max_len, ttl, _encode(value)])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to append to cache list '{key}': {str(e)}")
+            return False
+    
+    async def get_list(self, key: str) -> List[Any]:
+        """Items of the list at ``key``, oldest first (empty when missing)"""
+        try:
+            return [_decode(value) for value in await self.client.lrange(key, 0, -1)]
+        except Exception as e:
+            logger.error(f"Failed to get cache list '{key}': {str(e)}")
+            return []
+    
+    async def publish_invalidation(self, keys: List[str]):
+        """Tell every worker's in-process tier that ``keys`` changed"""
+        try:
+            await self.client.publish(self.INVALIDATION_CHANNEL, _dumps(keys))
+        except Exception as e:
+            logger.error(f"Failed to publish invalidation of {len(keys)} keys: {str(e)}")
+    
+    async def listen_invalidations(self, callback: Callable[[List[str]], Awaitable[Any]]):
+        """Call ``callback`` with the keys of every published invalidation (runs until cancelled)"""
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.INVALIDATION_CHANNEL)
+                try:
+                    async for message in pubsub.listen():
+                        await callback(_loads(message["data"]))
+                finally:
+                    await pubsub.reset()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Missed messages only cost staleness up to the L1 TTL; resubscribe
+                logger.warning(f"Invalidation subscription lost: {str(e)}")
+                await asyncio.sleep(1)
 
 class CacheService:
     """Main cache service with automatic fallback"""
     
+    # Backend methods bound onto the service once initialize() picks a backend
+    BOUND_METHODS = ("get", "set", "get_many", "set_many", "exists", "exists_many", "append_capped", "get_list")
+    # Also bound, unless in-process tiers must be purged alongside a shared backend
+    PURGING_METHODS = ("delete", "delete_many", "clear")
+    
     def __init__(self):
-        self.primary_cache = None
-        self.fallback_cache = None
         self.current_cache = None
+        self.cache_type = "unknown"
+        # In-process L1 in front of Redis; None when the backend is already in-memory
+        self._l1: Optional[InMemoryCache] = None
+        # query hash -> future of the AI response currently being computed
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Evict in-process copies of keys deleted by any worker (see on_invalidation)
+        self._invalidation_callbacks: List[Callable[[List[str]], Awaitable[Any]]] = []
+        self._invalidation_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
         """Initialize cache with fallback strategy"""
         # Try Redis first
         if REDIS_AVAILABLE and (get_redis_url() or os.getenv("REDIS_URL")):
             try:
-                self.primary_cache = RedisCache()
-                await self.primary_cache.initialize()
-                self.current_cache = self.primary_cache
+                redis_cache = RedisCache()
+                await redis_cache.initialize()
+                if CACHE_L1_MAX > 0:
+                    self._l1 = InMemoryCache(max_size=CACHE_L1_MAX)
+                    await self._l1.initialize()
+                    self.on_invalidation(self._l1.delete_many)
+                self._use(redis_cache, "redis")
+                self._invalidation_task = asyncio.create_task(
+                    redis_cache.listen_invalidations(self._dispatch_invalidation)
+                )
                 logger.info("Using Redis as primary cache")
                 return
             except Exception as e:
                 logger.warning(f"Redis initialization failed: {str(e)}")
         
         # Fallback to in-memory cache
-        self.fallback_cache = InMemoryCache()
-        await self.fallback_cache.initialize()
-        self.current_cache = self.fallback_cache
+        memory_cache = InMemoryCache()
+        await memory_cache.initialize()
+        self._use(memory_cache, "memory")
         logger.info("Using in-memory cache as fallback")
     
+    def _use(self, cache: Union[RedisCache, InMemoryCache], cache_type: str):
+        """Make ``cache`` the backend and bind its methods directly onto the service"""
+        self.current_cache = cache
+        self.cache_type = cache_type
+        # Instance attributes shadow the delegating methods below, saving a frame per call
+        bound = self.BOUND_METHODS if cache_type == "redis" else self.BOUND_METHODS + self.PURGING_METHODS
+        for name in bound:
+            setattr(self, name, getattr(cache, name))
+        self._increment_window = cache.increment_window
+    
     async def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
         return await self.current_cache.get(key)
@@ -217,74 +568,197 @@ class CacheService:
     
     async def delete(self, key: str) -> bool:
         """Delete key from cache"""
-        return await self.current_cache.delete(key)
+        if self._l1:
+            await self._l1.delete(key)
+        deleted = await self.current_cache.delete(key)
+        await self._publish_invalidation([key])
+        return deleted
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Get several values in one round trip (None for misses)"""
+        return await self.current_cache.get_many(keys)
+    
+    async def set_many(self, items: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several values with the same TTL in one round trip"""
+        return await self.current_cache.set_many(items, ttl)
+    
+    async def delete_many(self, keys: List[str]) -> int:
+        """Delete several keys in one round trip"""
+        if self._l1:
+            await self._l1.delete_many(keys)
+        deleted = await self.current_cache.delete_many(keys)
+        await self._publish_invalidation(keys)
+        return deleted
     
     async def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
         return await self.current_cache.exists(key)
     
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """Check several keys in one round trip"""
+        return await self.current_cache.exists_many(keys)
+    
+    async def append_capped(self, key: str, value: Any, max_len: int, ttl: int) -> bool:
+        """Atomically append to a list, keeping its newest ``max_len`` items"""
+        return await self.current_cache.append_capped(key, value, max_len, ttl)
+    
+    async def get_list(self, key: str) -> List[Any]:
+        """Items of a list written with append_capped, oldest first"""
+        return await self.current_cache.get_list(key)
+    
     async def clear(self) -> bool:
         """Clear all cache entries"""
+        if self._l1:
+            await self._l1.clear()
         return await self.current_cache.clear()
     
+    def on_invalidation(self, callback: Callable[[List[str]], Awaitable[Any]]):
+        """Register ``callback(keys)`` to run when any worker deletes keys from the shared cache"""
+        self._invalidation_callbacks.append(callback)
+    
+    async def _dispatch_invalidation(self, keys: List[str]):
+        """Run every invalidation callback for keys published by some worker"""
+        for callback in self._invalidation_callbacks:
+            try:
+                await callback(keys)
+            except Exception as e:
+                logger.error(f"Invalidation callback failed: {str(e)}")
+    
+    async def _publish_invalidation(self, keys: List[str]):
+        """Broadcast deleted keys to other workers (only a shared backend has other workers)"""
+        if keys and self.cache_type == "redis":
+            await self.current_cache.publish_invalidation(keys)
+    
+    async def _get_tiered(self, key: str) -> Optional[Any]:
+        """Get through the L1, back-filling it from the backend on a miss"""
+        if self._l1 is None:
+            return await self.get(key)
+        value = await self._l1.get(key)
+        if value is None:
+            value = await self.get(key)
+            if value is not None:
+                await self._l1.set(key, value, CACHE_L1_TTL)
+        return value
+    
+    async def _set_tiered(self, key: str, value: Any, ttl: int) -> bool:
+        """Write through to the backend and the L1"""
+        if self._l1 is not None:
+            await self._l1.set(key, value, min(ttl, CACHE_L1_TTL))
+        return await self.set(key, value, ttl)
+    
     def get_cache_type(self) -> str:
         """Get current cache type"""
-        if isinstance(self.current_cache, RedisCache):
-            return "redis"
-        elif isinstance(self.current_cache, InMemoryCache):
-            return "memory"
-        else:
-            return "unknown"
+        return self.cache_type
+    
+    async def set_tagged(self, key: str, value: Any, ttl: int, tag: str) -> bool:
+        """Set a value and record it under ``tag`` so invalidate_tag can drop it"""
+        return await self.current_cache.set_indexed(key, value, ttl, f"tag:{tag}")
+    
+    async def invalidate_tag(self, tag: str) -> int:
+        """Drop every key recorded under ``tag``"""
+        return await self.current_cache.delete_indexed(f"tag:{tag}")
     
     # Specialized cache methods
-    async def cache_ai_response(self, query_hash: str, response: Any, ttl: int = 3600) -> bool:
-        """Cache AI response with specific TTL"""
+    async def cache_ai_response(
+        self,
+        query_hash: str,
+        response: Any,
+        ttl: int = 3600,
+        document_id: Optional[str] = None
+    ) -> bool:
+        """Cache AI response with specific TTL, indexed by document when given"""
         cache_key = f"ai_response:{query_hash}"
+        if document_id:
+            return await self.current_cache.set_indexed(cache_key, response, ttl, f"ai_index:{document_id}")
         return await self.set(cache_key, response, ttl)
     
+    async def invalidate_ai_responses(self, document_id: str) -> int:
+        """Drop every cached AI response recorded for a document"""
+        return await self.current_cache.delete_indexed(f"ai_index:{document_id}")
+    
     async def get_cached_ai_response(self, query_hash: str) -> Optional[Any]:
         """Get cached AI response"""
         cache_key = f"ai_response:{query_hash}"
         return await self.get(cache_key)
     
+    async def get_or_compute_ai_response(
+        self,
+        query_hash: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int = 3600,
+        document_id: Optional[str] = None
+    ) -> Any:
+        """
+        Return the cached AI response, computing it on a miss
+        
+        Concurrent misses for the same hash share a single ``compute()`` call
+        instead of each calling the AI backend.
+        """
+        cached = await self.get_cached_ai_response(query_hash)
+        if cached is not None:
+            return cached
+        
+        inflight = self._inflight.get(query_hash)
+        if inflight is not None:
+            # Shield so a cancelled waiter doesn't cancel the shared computation
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[query_hash] = future
+        try:
+            value = await compute()
+            await self.cache_ai_response(query_hash, value, ttl, document_id)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved: with no waiters the error is still raised to this caller
+            future.exception()
+            raise
+        finally:
+            del self._inflight[query_hash]
+    
     async def cache_document_summary(self, document_id: str, summary: Any, ttl: int = 7200) -> bool:
         """Cache document summary"""
         cache_key = f"summary:{document_id}"
-        return await self.set(cache_key, summary, ttl)
+        return await self._set_tiered(cache_key, summary, ttl)
     
     async def get_cached_document_summary(self, document_id: str) -> Optional[Any]:
         """Get cached document summary"""
         cache_key = f"summary:{document_id}"
-        return await self.get(cache_key)
+        return await self._get_tiered(cache_key)
     
     async def cache_user_session(self, user_id: str, session_data: Any, ttl: int = 1800) -> bool:
         """Cache user session data"""
         cache_key = f"session:{user_id}"
-        return await self.set(cache_key, session_data, ttl)
+        return await self._set_tiered(cache_key, session_data, ttl)
     
     async def get_cached_user_session(self, user_id: str) -> Optional[Any]:
         """Get cached user session"""
         cache_key = f"session:{user_id}"
-        return await self.get(cache_key)
+        return await self._get_tiered(cache_key)
     
     async def increment_rate_limit(self, identifier: str, window: int = 3600) -> int:
-        """Increment rate limit counter"""
-        if isinstance(self.current_cache, RedisCache):
-            cache_key = f"rate_limit:{identifier}"
-            return await self.current_cache.increment(cache_key, 1, window)
-        else:
-            # Fallback for in-memory cache
-            cache_key = f"rate_limit:{identifier}"
-            current = await self.get(cache_key) or 0
-            new_value = current + 1
-            await self.set(cache_key, new_value, window)
-            return new_value
+        """Increment rate limit counter and return the new count"""
+        # Both backends increment atomically and keep the window's original expiry
+        cache_key = f"rate_limit:{identifier}"
+        return await self._increment_window(cache_key, window)
 
 # Utility functions
+# Non-cryptographic key hashing: "xxh3" (blake2b when xxhash isn't installed) or legacy "md5"
+CACHE_HASH = os.getenv("CACHE_HASH", "xxh3").lower()
+
+# Hot keys (the same document/user ids on every request) skip formatting and hashing;
+# arguments must therefore be hashable scalars
+@functools.lru_cache(maxsize=4096, typed=True)
 def generate_cache_key(*args) -> str:
     """Generate a cache key from arguments"""
-    key_string = ":".join(str(arg) for arg in args)
-    return hashlib.md5(key_string.encode()).hexdigest()
+    key_bytes = ":".join(str(arg) for arg in args).encode()
+    if CACHE_HASH == "md5":
+        return hashlib.md5(key_bytes).hexdigest()
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_128_hexdigest(key_bytes)
+    return hashlib.blake2b(key_bytes, digest_size=16).hexdigest()
 
 def generate_query_hash(document_id: str, query: str, **kwargs) -> str:
     """Generate a hash for AI query caching"""
@@ -293,8 +767,7 @@ def generate_query_hash(document_id: str, query: str, **kwargs) -> str:
         "query": query,
         **kwargs
     }
-    query_string = json.dumps(query_data, sort_keys=True)
-    return hashlib.sha256(query_string.encode()).hexdigest()
+    return hashlib.blake2b(_dumps(query_data, sort_keys=True), digest_size=16).hexdigest()
 
 # Global cache service instance
 cache_service = CacheService()
@@ -4,10 +4,11 @@ Database service with PostgreSQL primary and Firestore fallback
 """
 
 import os
+import re
 import json
 import asyncio
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta, timezone
 import logging
 from abc import ABC, abstractmethod
 
@@ -26,10 +27,82 @@ except ImportError:
     FIRESTORE_AVAILABLE = False
     firestore = None
 
-from models import Document
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+# Binary JSONB wire format: a version byte followed by the JSON text
+JSONB_VERSION = b"\x01"
+
+def _jsonb_encode(value: Any) -> bytes:
+    """Encode a Python value for a JSONB parameter"""
+    if ORJSON_AVAILABLE:
+        return JSONB_VERSION + orjson.dumps(value)
+    return JSONB_VERSION + json.dumps(value, default=str).encode()
+
+def _jsonb_decode(value: bytes) -> Any:
+    """Decode a JSONB column value"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(value[1:])
+    return json.loads(value[1:])
+
+async def _init_connection(conn):
+    """Per-connection setup: let the driver convert JSONB to and from Python objects"""
+    await conn.set_type_codec(
+        'jsonb',
+        encoder=_jsonb_encode,
+        decoder=_jsonb_decode,
+        schema='pg_catalog',
+        format='binary'  # bytes straight into orjson, no str round-trip
+    )
+
+from models import ChatMessage, Document, DocumentMeta, DocumentMetaListAdapter, Language
+
+# Columns needed for listings; text and chat_history are only read for single-document fetches
+META_COLUMNS = (
+    "document_id", "filename", "title", "user_id", "meta",
+    "created_at", "updated_at", "detected_language"
+)
 
 logger = logging.getLogger(__name__)
 
+# Firestore keyword search: lowercase word tokens stored on each document and matched with array-contains.
+# Capped well under Firestore's 40k index entries per document.
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+FIRESTORE_MAX_SEARCH_TOKENS = 10000
+
+def _search_tokens(text: str, limit: Optional[int] = None) -> List[str]:
+    """Distinct lowercase word tokens of ``text`` in first-seen order"""
+    tokens = dict.fromkeys(SEARCH_TOKEN_PATTERN.findall(text.lower()))
+    return list(tokens)[:limit]
+
+def _aggregate_json(subquery: str, order_by: str, drop: Optional[str] = None) -> str:
+    """
+    Wrap a row query so Postgres returns the page as one JSONB array
+    
+    One value is decoded client-side instead of a record per row; nulls are
+    stripped so model defaults apply (e.g. meta -> {}).
+    """
+    row = "to_jsonb(d)" if drop is None else f"to_jsonb(d) - '{drop}'"
+    return (
+        f"SELECT COALESCE(jsonb_agg(jsonb_strip_nulls({row}) ORDER BY {order_by}), '[]'::jsonb) "
+        f"FROM ({subquery}) d"
+    )
+
+# Prepared statements cached per connection (0 disables, e.g. behind pgbouncer transaction pooling)
+PG_STATEMENT_CACHE_SIZE = int(os.getenv("PG_STATEMENT_CACHE_SIZE", "1024"))
+
+# Pool sizing: max_size caps concurrent queries per worker, so keep it above expected in-flight requests
+# (and workers * max_size below the server's max_connections)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "5"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "50"))
+# Recycle idle connections after this many seconds and busy ones after this many queries
+DB_MAX_INACTIVE_CONNECTION_LIFETIME = float(os.getenv("DB_MAX_INACTIVE_CONNECTION_LIFETIME", "300"))
+DB_MAX_QUERIES = int(os.getenv("DB_MAX_QUERIES", "50000"))
+
 class DatabaseInterface(ABC):
     """Abstract database interface"""
     
@@ -42,7 +115,26 @@ class DatabaseInterface(ABC):
         pass
     
     @abstractmethod
-    async def list_documents(self, user_id: Optional[str] = None, limit: int = 100) -> List[Document]:
+    async def list_documents(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[DocumentMeta]:
+        pass
+    
+    @abstractmethod
+    def iter_documents(
+        self,
+        user_id: Optional[str] = None,
+        before: Optional[datetime] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[DocumentMeta]:
+        pass
+    
+    @abstractmethod
+    async def count_documents(self, user_id: Optional[str] = None) -> int:
         pass
     
     @abstractmethod
@@ -54,12 +146,141 @@ class DatabaseInterface(ABC):
         pass
     
     @abstractmethod
-    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[Document]:
+    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[DocumentMeta]:
         pass
+    
+    async def save_documents_bulk(self, documents: List[Document]) -> bool:
+        """Save several documents; backends override this with a batched write"""
+        results = [await self.save_document(document) for document in documents]
+        return all(results)
+    
+    async def aggregate_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Document statistics from streamed metadata; backends override this with a server-side aggregate"""
+        stats = {"total_documents": 0, "total_size": 0, "file_types": {}, "languages": {}, "recent_uploads": 0}
+        recent_since = datetime.now(timezone.utc) - timedelta(days=1)
+        async for doc in self.iter_documents(user_id):
+            stats["total_documents"] += 1
+            stats["total_size"] += doc.meta.get("file_size", 0)
+            file_type = doc.meta.get("file_type", "unknown")
+            stats["file_types"][file_type] = stats["file_types"].get(file_type, 0) + 1
+            language = getattr(doc.detected_language, "value", doc.detected_language) or "unknown"
+            stats["languages"][language] = stats["languages"].get(language, 0) + 1
+            created_at = doc.created_at
+            if isinstance(created_at, datetime):
+                if created_at.tzinfo is None:
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                if created_at > recent_since:
+                    stats["recent_uploads"] += 1
+        return stats
+    
+    async def append_chat_messages(self, document_id: str, messages: List[ChatMessage]) -> bool:
+        """Append to a document's chat history; backends override this to skip rewriting the text"""
+        document = await self.get_document(document_id)
+        if document is None:
+            return False
+        document.chat_history.extend(messages)
+        return await self.update_document(document)
 
 class PostgreSQLDatabase(DatabaseInterface):
     """PostgreSQL database implementation"""
     
+    META_SELECT = ", ".join(META_COLUMNS)
+    # Full document without search_vector, which only the FTS index needs
+    DOCUMENT_SELECT = ", ".join(META_COLUMNS + ("text", "chat_history"))
+    
+    # Full-text vector kept by Postgres as a stored generated column (no PL/pgSQL trigger)
+    SEARCH_VECTOR_EXPRESSION = "to_tsvector('english'::regconfig, COALESCE(title, '') || ' ' || COALESCE(text, ''))"
+    
+    # Constant SQL text so asyncpg's per-connection statement cache reuses the parsed plans
+    SAVE_SQL = """
+        INSERT INTO documents (
+            document_id, filename, title, text, user_id, meta,
+            detected_language, chat_history
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        ON CONFLICT (document_id) DO UPDATE SET
+            filename = EXCLUDED.filename,
+            title = EXCLUDED.title,
+            text = EXCLUDED.text,
+            user_id = EXCLUDED.user_id,
+            meta = EXCLUDED.meta,
+            detected_language = EXCLUDED.detected_language,
+            chat_history = EXCLUDED.chat_history,
+            updated_at = NOW()
+    """
+    GET_SQL = f"SELECT {DOCUMENT_SELECT} FROM documents WHERE document_id = $1"
+    COUNT_BY_USER_SQL = "SELECT count(*) FROM documents WHERE user_id = $1"
+    # Streamed through a server-side cursor; NULL parameters mean "no filter"
+    ITER_SQL = f"""
+        SELECT {META_SELECT} FROM documents
+        WHERE ($1::text IS NULL OR user_id = $1)
+          AND ($2::timestamptz IS NULL OR (created_at, document_id) < ($2, $3::text))
+        ORDER BY created_at DESC, document_id DESC
+    """
+    COUNT_SQL = "SELECT count(*) FROM documents"
+    # All statistics in one round trip, shaped like the service's stats dict (NULL $1 = every user)
+    STATS_SQL = """
+        WITH d AS (
+            SELECT COALESCE(meta->>'file_type', 'unknown') AS file_type,
+                   COALESCE((meta->>'file_size')::numeric, 0) AS file_size,
+                   COALESCE(detected_language, 'unknown') AS language,
+                   created_at
+            FROM documents
+            WHERE $1::text IS NULL OR user_id = $1
+        )
+        SELECT jsonb_build_object(
+            'total_documents', (SELECT count(*) FROM d),
+            'total_size', (SELECT COALESCE(sum(file_size), 0)::bigint FROM d),
+            'recent_uploads', (SELECT count(*) FROM d WHERE created_at > NOW() - interval '1 day'),
+            'file_types', (SELECT COALESCE(jsonb_object_agg(file_type, n), '{}'::jsonb)
+                           FROM (SELECT file_type, count(*) AS n FROM d GROUP BY file_type) t),
+            'languages', (SELECT COALESCE(jsonb_object_agg(language, n), '{}'::jsonb)
+                          FROM (SELECT language, count(*) AS n FROM d GROUP BY language) l)
+        )
+    """
+    DELETE_SQL = "DELETE FROM documents WHERE document_id = $1 RETURNING document_id"
+    # Only chat_history changes, so the text and generated search_vector are left untouched
+    APPEND_CHAT_SQL = """
+        UPDATE documents
+        SET chat_history = COALESCE(chat_history, '[]'::jsonb) || $2::jsonb, updated_at = NOW()
+        WHERE document_id = $1
+        RETURNING document_id
+    """
+    LIST_BY_USER_SQL = _aggregate_json(
+        f"SELECT {META_SELECT} FROM documents WHERE user_id = $1 ORDER BY created_at DESC, document_id DESC LIMIT $2",
+        "d.created_at DESC, d.document_id DESC"
+    )
+    LIST_SQL = _aggregate_json(
+        f"SELECT {META_SELECT} FROM documents ORDER BY created_at DESC, document_id DESC LIMIT $1",
+        "d.created_at DESC, d.document_id DESC"
+    )
+    # Keyset pages: continue below the last (created_at, document_id) seen instead of OFFSET
+    # scan-and-skip; the id breaks created_at ties so no row is skipped between pages.
+    # A NULL id compares as "strictly before created_at" (row comparison stops at the first unequal column)
+    LIST_BY_USER_BEFORE_SQL = _aggregate_json(
+        f"SELECT {META_SELECT} FROM documents WHERE user_id = $1 AND (created_at, document_id) < ($3, $4::text) "
+        "ORDER BY created_at DESC, document_id DESC LIMIT $2",
+        "d.created_at DESC, d.document_id DESC"
+    )
+    LIST_BEFORE_SQL = _aggregate_json(
+        f"SELECT {META_SELECT} FROM documents WHERE (created_at, document_id) < ($2, $3::text) "
+        "ORDER BY created_at DESC, document_id DESC LIMIT $1",
+        "d.created_at DESC, d.document_id DESC"
+    )
+    SEARCH_BY_USER_SQL = _aggregate_json(f"""
+        SELECT {META_SELECT}, ts_rank(search_vector, plainto_tsquery('english', $1)) as rank
+        FROM documents 
+        WHERE search_vector @@ plainto_tsquery('english', $1) AND user_id = $2
+        ORDER BY rank DESC, created_at DESC
+        LIMIT 50
+    """, "d.rank DESC, d.created_at DESC", drop="rank")
+    SEARCH_SQL = _aggregate_json(f"""
+        SELECT {META_SELECT}, ts_rank(search_vector, plainto_tsquery('english', $1)) as rank
+        FROM documents 
+        WHERE search_vector @@ plainto_tsquery('english', $1)
+        ORDER BY rank DESC, created_at DESC
+        LIMIT 50
+    """, "d.rank DESC, d.created_at DESC", drop="rank")
+    
     def __init__(self):
         self.connection_string = os.getenv("DATABASE_URL")
         self.pool = None
@@ -72,9 +293,14 @@ class PostgreSQLDatabase(DatabaseInterface):
         try:
             self.pool = await asyncpg.create_pool(
                 self.connection_string,
-                min_size=1,
-                max_size=10,
-                command_timeout=60
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONNECTION_LIFETIME,
+                max_queries=DB_MAX_QUERIES,
+                command_timeout=60,
+                statement_cache_size=PG_STATEMENT_CACHE_SIZE,
+                max_cached_statement_lifetime=0,  # statements are constant; never expire them
+                init=_init_connection
             )
             await self._create_tables()
             logger.info("PostgreSQL database initialized successfully")
@@ -85,7 +311,7 @@ class PostgreSQLDatabase(DatabaseInterface):
     async def _create_tables(self):
         """Create database tables if they don't exist"""
         async with self.pool.acquire() as conn:
-            await conn.execute("""
+            await conn.execute(f"""
                 CREATE TABLE IF NOT EXISTS documents (
                     document_id VARCHAR(255) PRIMARY KEY,
                     filename VARCHAR(500) NOT NULL,
@@ -97,111 +323,151 @@ class PostgreSQLDatabase(DatabaseInterface):
                     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
                     detected_language VARCHAR(10),
                     chat_history JSONB DEFAULT '[]'::jsonb,
-                    search_vector tsvector
+                    search_vector tsvector GENERATED ALWAYS AS ({self.SEARCH_VECTOR_EXPRESSION}) STORED
                 );
             """)
             
-            # Create indexes for better performance
-            await conn.execute("""
-                CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
-                CREATE INDEX IF NOT EXISTS idx_documents_created_at ON documents(created_at);
-                CREATE INDEX IF NOT EXISTS idx_documents_search_vector ON documents USING GIN(search_vector);
-            """)
-            
-            # Create trigger for search vector updates
-            await conn.execute("""
-                CREATE OR REPLACE FUNCTION update_search_vector() RETURNS trigger AS $$
+            # Migrate tables created with the old trigger-maintained column (drops its index too)
+            await conn.execute(f"""
+                DO $$
                 BEGIN
-                    NEW.search_vector := to_tsvector('english', COALESCE(NEW.title, '') || ' ' || COALESCE(NEW.text, ''));
-                    NEW.updated_at := NOW();
-                    RETURN NEW;
-                END;
-                $$ LANGUAGE plpgsql;
+                    IF EXISTS (
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_name = 'documents' AND column_name = 'search_vector'
+                          AND is_generated = 'NEVER'
+                    ) THEN
+                        DROP TRIGGER IF EXISTS update_documents_search_vector ON documents;
+                        ALTER TABLE documents DROP COLUMN search_vector;
+                        ALTER TABLE documents ADD COLUMN search_vector tsvector
+                            GENERATED ALWAYS AS ({self.SEARCH_VECTOR_EXPRESSION}) STORED;
+                    END IF;
+                END
+                $$;
+                DROP FUNCTION IF EXISTS update_search_vector();
             """)
             
+            # Per-user listings (WHERE user_id ORDER BY created_at DESC, document_id DESC LIMIT) read this
+            # index in order with no sort step; it also serves user_id lookups, replacing the older indexes
+            new_listing_index = await conn.fetchval(
+                "SELECT to_regclass('idx_documents_user_created_id') IS NULL"
+            )
+            
+            # Create indexes for better performance
             await conn.execute("""
-                DROP TRIGGER IF EXISTS update_documents_search_vector ON documents;
-                CREATE TRIGGER update_documents_search_vector
-                    BEFORE INSERT OR UPDATE ON documents
-                    FOR EACH ROW EXECUTE FUNCTION update_search_vector();
+                CREATE INDEX IF NOT EXISTS idx_documents_user_created_id
+                    ON documents(user_id, created_at DESC, document_id DESC);
+                DROP INDEX IF EXISTS idx_documents_user_created;
+                DROP INDEX IF EXISTS idx_documents_user_id;
+                CREATE INDEX IF NOT EXISTS idx_documents_created_id ON documents(created_at DESC, document_id DESC);
+                DROP INDEX IF EXISTS idx_documents_created_at;
+                CREATE INDEX IF NOT EXISTS idx_documents_search_vector ON documents USING GIN(search_vector);
             """)
+            if new_listing_index:
+                # Refresh planner statistics so existing tables switch to the new index right away
+                await conn.execute("ANALYZE documents")
     
     async def save_document(self, document: Document) -> bool:
         """Save document to PostgreSQL"""
         try:
-            async with self.pool.acquire() as conn:
-                await conn.execute("""
-                    INSERT INTO documents (
-                        document_id, filename, title, text, user_id, meta,
-                        detected_language, chat_history
-                    ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-                    ON CONFLICT (document_id) DO UPDATE SET
-                        filename = EXCLUDED.filename,
-                        title = EXCLUDED.title,
-                        text = EXCLUDED.text,
-                        user_id = EXCLUDED.user_id,
-                        meta = EXCLUDED.meta,
-                        detected_language = EXCLUDED.detected_language,
-                        chat_history = EXCLUDED.chat_history,
-                        updated_at = NOW()
-                """, 
-                    document.document_id,
-                    document.filename,
-                    document.title,
-                    document.text,
-                    document.user_id,
-                    json.dumps(document.meta) if document.meta else None,
-                    document.detected_language,
-                    json.dumps([msg.dict() for msg in document.chat_history])
-                )
+            await self.pool.execute(self.SAVE_SQL, *self._save_args(document))
             return True
         except Exception as e:
             logger.error(f"Failed to save document to PostgreSQL: {str(e)}")
             return False
     
+    async def save_documents_bulk(self, documents: List[Document]) -> bool:
+        """Save several documents with one executemany in a single transaction"""
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.executemany(self.SAVE_SQL, [self._save_args(doc) for doc in documents])
+            return True
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(documents)} documents to PostgreSQL: {str(e)}")
+            return False
+    
+    @staticmethod
+    def _save_args(document: Document) -> tuple:
+        """Positional parameters for SAVE_SQL"""
+        return (
+            document.document_id,
+            document.filename,
+            document.title,
+            document.text,
+            document.user_id,
+            document.meta or None,
+            document.detected_language,
+            [msg.dict() for msg in document.chat_history]
+        )
+    
     async def get_document(self, document_id: str) -> Optional[Document]:
         """Get document from PostgreSQL"""
         try:
-            async with self.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    "SELECT * FROM documents WHERE document_id = $1",
-                    document_id
-                )
-                if row:
-                    return self._row_to_document(row)
-                return None
+            row = await self.pool.fetchrow(self.GET_SQL, document_id)
+            if row:
+                return self._row_to_document(row)
+            return None
         except Exception as e:
             logger.error(f"Failed to get document from PostgreSQL: {str(e)}")
             return None
     
-    async def list_documents(self, user_id: Optional[str] = None, limit: int = 100) -> List[Document]:
-        """List documents from PostgreSQL"""
+    async def list_documents(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[DocumentMeta]:
+        """List document metadata from PostgreSQL, newest first (after the ``before``/``before_id`` keyset if given)"""
         try:
-            async with self.pool.acquire() as conn:
-                if user_id:
-                    rows = await conn.fetch(
-                        "SELECT * FROM documents WHERE user_id = $1 ORDER BY created_at DESC LIMIT $2",
-                        user_id, limit
-                    )
-                else:
-                    rows = await conn.fetch(
-                        "SELECT * FROM documents ORDER BY created_at DESC LIMIT $1",
-                        limit
-                    )
-                return [self._row_to_document(row) for row in rows]
+            if user_id and before:
+                rows = await self.pool.fetchval(self.LIST_BY_USER_BEFORE_SQL, user_id, limit, before, before_id)
+            elif user_id:
+                rows = await self.pool.fetchval(self.LIST_BY_USER_SQL, user_id, limit)
+            elif before:
+                rows = await self.pool.fetchval(self.LIST_BEFORE_SQL, limit, before, before_id)
+            else:
+                rows = await self.pool.fetchval(self.LIST_SQL, limit)
+            return DocumentMetaListAdapter.validate_python(rows)
         except Exception as e:
             logger.error(f"Failed to list documents from PostgreSQL: {str(e)}")
             return []
     
+    async def iter_documents(
+        self,
+        user_id: Optional[str] = None,
+        before: Optional[datetime] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[DocumentMeta]:
+        """Stream document metadata through a server-side cursor, ``batch_size`` rows at a time"""
+        async with self.pool.acquire() as conn:
+            # Cursors only live inside a transaction
+            async with conn.transaction():
+                async for row in conn.cursor(self.ITER_SQL, user_id, before, None, prefetch=batch_size):
+                    yield self._row_to_meta(row)
+    
+    async def count_documents(self, user_id: Optional[str] = None) -> int:
+        """Count documents in PostgreSQL"""
+        try:
+            if user_id:
+                return await self.pool.fetchval(self.COUNT_BY_USER_SQL, user_id)
+            return await self.pool.fetchval(self.COUNT_SQL)
+        except Exception as e:
+            logger.error(f"Failed to count documents in PostgreSQL: {str(e)}")
+            return 0
+    
+    async def aggregate_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Document statistics aggregated by PostgreSQL"""
+        try:
+            return await self.pool.fetchval(self.STATS_SQL, user_id)
+        except Exception as e:
+            logger.error(f"Failed to aggregate document stats in PostgreSQL: {str(e)}")
+            return await super().aggregate_stats(user_id)
+    
     async def delete_document(self, document_id: str) -> bool:
         """Delete document from PostgreSQL"""
         try:
-            async with self.pool.acquire() as conn:
-                result = await conn.execute(
-                    "DELETE FROM documents WHERE document_id = $1",
-                    document_id
-                )
-                return result == "DELETE 1"
+            return await self.pool.fetchval(self.DELETE_SQL, document_id) is not None
         except Exception as e:
             logger.error(f"Failed to delete document from PostgreSQL: {str(e)}")
             return False
@@ -210,53 +476,65 @@ class PostgreSQLDatabase(DatabaseInterface):
         """Update document in PostgreSQL"""
         return await self.save_document(document)
     
-    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[Document]:
-        """Search documents using full-text search"""
+    async def append_chat_messages(self, document_id: str, messages: List[ChatMessage]) -> bool:
+        """Append to chat_history in place with JSONB concatenation"""
         try:
-            async with self.pool.acquire() as conn:
-                if user_id:
-                    rows = await conn.fetch("""
-                        SELECT *, ts_rank(search_vector, plainto_tsquery('english', $1)) as rank
-                        FROM documents 
-                        WHERE search_vector @@ plainto_tsquery('english', $1) AND user_id = $2
-                        ORDER BY rank DESC, created_at DESC
-                        LIMIT 50
-                    """, query, user_id)
-                else:
-                    rows = await conn.fetch("""
-                        SELECT *, ts_rank(search_vector, plainto_tsquery('english', $1)) as rank
-                        FROM documents 
-                        WHERE search_vector @@ plainto_tsquery('english', $1)
-                        ORDER BY rank DESC, created_at DESC
-                        LIMIT 50
-                    """, query)
-                return [self._row_to_document(row) for row in rows]
+            payload = [msg.dict() for msg in messages]
+            return await self.pool.fetchval(self.APPEND_CHAT_SQL, document_id, payload) is not None
+        except Exception as e:
+            logger.error(f"Failed to append chat messages in PostgreSQL: {str(e)}")
+            return False
+    
+    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[DocumentMeta]:
+        """Search documents using the full-text index, returning metadata only"""
+        try:
+            if user_id:
+                rows = await self.pool.fetchval(self.SEARCH_BY_USER_SQL, query, user_id)
+            else:
+                rows = await self.pool.fetchval(self.SEARCH_SQL, query)
+            return DocumentMetaListAdapter.validate_python(rows)
         except Exception as e:
             logger.error(f"Failed to search documents in PostgreSQL: {str(e)}")
             return []
     
-    def _row_to_document(self, row) -> Document:
-        """Convert database row to Document object"""
-        from models import ChatMessage
-        
-        chat_history = []
-        if row['chat_history']:
-            chat_data = json.loads(row['chat_history']) if isinstance(row['chat_history'], str) else row['chat_history']
-            chat_history = [ChatMessage(**msg) for msg in chat_data]
+    def _row_fields(self, row) -> Dict[str, Any]:
+        """Extract the metadata columns shared by metadata and full document rows"""
+        return {
+            "document_id": row['document_id'],
+            "filename": row['filename'],
+            "title": row['title'],
+            "user_id": row['user_id'],
+            "meta": row['meta'] or {},  # JSONB arrives decoded (see _init_connection)
+            "created_at": row['created_at'],
+            "updated_at": row['updated_at'],
+            "detected_language": Language(row['detected_language']) if row['detected_language'] else None
+        }
+    
+    def _build(self, model, fields: Dict[str, Any], trusted: bool):
+        """
+        Build ``model`` from row fields
         
-        meta = json.loads(row['meta']) if row['meta'] and isinstance(row['meta'], str) else row['meta'] or {}
+        Rows we wrote ourselves already carry native types, so ``trusted`` skips
+        Pydantic validation via model_construct; NULL columns fall back to model defaults.
+        """
+        fields = {name: value for name, value in fields.items() if value is not None}
+        if trusted:
+            return model.model_construct(**fields)
+        return model(**fields)
+    
+    def _row_to_meta(self, row, trusted: bool = True) -> DocumentMeta:
+        """Convert a metadata-only row to a DocumentMeta object"""
+        return self._build(DocumentMeta, self._row_fields(row), trusted)
+    
+    def _row_to_document(self, row, trusted: bool = True) -> Document:
+        """Convert database row to Document object"""
+        # Chat messages come from JSON (string timestamps and languages), so they are always validated
+        chat_history = [ChatMessage(**msg) for msg in row['chat_history'] or []]
         
-        return Document(
-            document_id=row['document_id'],
-            filename=row['filename'],
-            title=row['title'],
-            text=row['text'],
-            user_id=row['user_id'],
-            meta=meta,
-            created_at=row['created_at'].isoformat() if row['created_at'] else None,
-            updated_at=row['updated_at'].isoformat() if row['updated_at'] else None,
-            chat_history=chat_history,
-            detected_language=row['detected_language']
+        return self._build(
+            Document,
+            {**self._row_fields(row), "text": row['text'] or "", "chat_history": chat_history},
+            trusted
         )
 
 class FirestoreDatabase(DatabaseInterface):
@@ -274,19 +552,40 @@ class FirestoreDatabase(DatabaseInterface):
             logger.error(f"Failed to initialize Firestore: {str(e)}")
             raise
     
+    def _to_data(self, document: Document) -> Dict[str, Any]:
+        """Firestore fields for a document, including its denormalized search tokens"""
+        doc_data = document.dict()
+        doc_data['created_at'] = firestore.SERVER_TIMESTAMP
+        doc_data['updated_at'] = firestore.SERVER_TIMESTAMP
+        doc_data['search_tokens'] = _search_tokens(
+            f"{document.title or ''} {document.text or ''}", FIRESTORE_MAX_SEARCH_TOKENS
+        )
+        return doc_data
+    
     async def save_document(self, document: Document) -> bool:
         """Save document to Firestore"""
         try:
             doc_ref = self.db.collection('documents').document(document.document_id)
-            doc_data = document.dict()
-            doc_data['created_at'] = firestore.SERVER_TIMESTAMP
-            doc_data['updated_at'] = firestore.SERVER_TIMESTAMP
-            doc_ref.set(doc_data, merge=True)
+            doc_ref.set(self._to_data(document), merge=True)
             return True
         except Exception as e:
             logger.error(f"Failed to save document to Firestore: {str(e)}")
             return False
     
+    async def save_documents_bulk(self, documents: List[Document]) -> bool:
+        """Save several documents with batched writes (Firestore allows 500 per batch)"""
+        try:
+            collection = self.db.collection('documents')
+            for start in range(0, len(documents), 500):
+                batch = self.db.batch()
+                for document in documents[start:start + 500]:
+                    batch.set(collection.document(document.document_id), self._to_data(document), merge=True)
+                batch.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Failed to bulk save {len(documents)} documents to Firestore: {str(e)}")
+            return False
+    
     async def get_document(self, document_id: str) -> Optional[Document]:
         """Get document from Firestore"""
         try:
@@ -300,19 +599,71 @@ class FirestoreDatabase(DatabaseInterface):
             logger.error(f"Failed to get document from Firestore: {str(e)}")
             return None
     
-    async def list_documents(self, user_id: Optional[str] = None, limit: int = 100) -> List[Document]:
-        """List documents from Firestore"""
+    async def list_documents(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[DocumentMeta]:
+        """List document metadata from Firestore, newest first (after the ``before``/``before_id`` keyset if given)"""
+        try:
+            query = self._meta_query(user_id, before if before_id is None else None)
+            if before and before_id is not None:
+                query = query.start_after({'created_at': before, 'document_id': before_id})
+            docs = query.limit(limit).stream()
+            return [DocumentMeta(**doc.to_dict()) for doc in docs]
+        except Exception as e:
+            logger.error(f"Failed to list documents from Firestore: {str(e)}")
+            return []
+    
+    async def iter_documents(
+        self,
+        user_id: Optional[str] = None,
+        before: Optional[datetime] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[DocumentMeta]:
+        """Stream document metadata page by page, each page starting after the previous page's last snapshot"""
+        query = self._meta_query(user_id, before)
+        last_snapshot = None
+        while True:
+            page_query = query.limit(batch_size)
+            if last_snapshot is not None:
+                page_query = page_query.start_after(last_snapshot)
+            try:
+                page = list(page_query.stream())
+            except Exception as e:
+                logger.error(f"Failed to list documents from Firestore: {str(e)}")
+                return
+            for snapshot in page:
+                yield DocumentMeta(**snapshot.to_dict())
+            if len(page) < batch_size:
+                return
+            last_snapshot = page[-1]
+    
+    def _meta_query(self, user_id: Optional[str], before: Optional[datetime]):
+        """Metadata projection, newest first (document_id breaks ties), optionally filtered by owner and creation time"""
+        query = self.db.collection('documents').select(list(META_COLUMNS))
+        if user_id:
+            query = query.where('user_id', '==', user_id)
+        if before:
+            query = query.where('created_at', '<', before)
+        return (
+            query.order_by('created_at', direction=firestore.Query.DESCENDING)
+            .order_by('document_id', direction=firestore.Query.DESCENDING)
+        )
+    
+    async def count_documents(self, user_id: Optional[str] = None) -> int:
+        """Count documents with a server-side aggregation query"""
         try:
             query = self.db.collection('documents')
             if user_id:
                 query = query.where('user_id', '==', user_id)
-            query = query.order_by('created_at', direction=firestore.Query.DESCENDING).limit(limit)
-            
-            docs = query.stream()
-            return [Document(**doc.to_dict()) for doc in docs]
+            result = query.count().get()
+            return int(result[0][0].value)
         except Exception as e:
-            logger.error(f"Failed to list documents from Firestore: {str(e)}")
-            return []
+            logger.error(f"Failed to count documents in Firestore: {str(e)}")
+            return 0
     
     async def delete_document(self, document_id: str) -> bool:
         """Delete document from Firestore"""
@@ -328,16 +679,58 @@ class FirestoreDatabase(DatabaseInterface):
         """Update document in Firestore"""
         return await self.save_document(document)
     
-    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[Document]:
-        """Search documents (basic text matching for Firestore)"""
+    async def append_chat_messages(self, document_id: str, messages: List[ChatMessage]) -> bool:
+        """Append to chat_history in a transaction that reads and writes only that field"""
+        try:
+            doc_ref = self.db.collection('documents').document(document_id)
+            new_messages = [msg.dict() for msg in messages]
+            
+            @firestore.transactional
+            def append(transaction) -> bool:
+                # Not ArrayUnion: it drops messages equal to ones already stored (e.g. a repeated question)
+                snapshot = doc_ref.get(field_paths=['chat_history'], transaction=transaction)
+                if not snapshot.exists:
+                    return False
+                history = (snapshot.to_dict() or {}).get('chat_history') or []
+                transaction.update(doc_ref, {
+                    'chat_history': history + new_messages,
+                    'updated_at': firestore.SERVER_TIMESTAMP
+                })
+                return True
+            
+            return append(self.db.transaction())
+        except Exception as e:
+            logger.error(f"Failed to append chat messages in Firestore: {str(e)}")
+            return False
+    
+    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[DocumentMeta]:
+        """
+        Search documents containing every word of ``query``
+        
+        The most selective (longest) word is matched server-side against the indexed
+        ``search_tokens`` array; any other words are checked on the returned tokens.
+        Needs a composite index on (search_tokens, user_id, created_at desc).
+        """
         try:
-            # Basic search implementation - in production, use Algolia or similar
-            docs = await self.list_documents(user_id)
-            query_lower = query.lower()
-            return [
-                doc for doc in docs 
-                if query_lower in (doc.title or "").lower() or query_lower in (doc.text or "").lower()
-            ]
+            terms = _search_tokens(query)
+            if not terms:
+                return []
+            terms.sort(key=len, reverse=True)
+            
+            fields = list(META_COLUMNS) + (['search_tokens'] if len(terms) > 1 else [])
+            docs_query = self.db.collection('documents').select(fields)
+            docs_query = docs_query.where('search_tokens', 'array_contains', terms[0])
+            if user_id:
+                docs_query = docs_query.where('user_id', '==', user_id)
+            docs_query = docs_query.order_by('created_at', direction=firestore.Query.DESCENDING).limit(100)
+            
+            results = []
+            for doc in docs_query.stream():
+                data = doc.to_dict()
+                if len(terms) > 1 and not set(terms[1:]).issubset(data.get('search_tokens') or ()):
+                    continue
+                results.append(DocumentMeta(**data))
+            return results
         except Exception as e:
             logger.error(f"Failed to search documents in Firestore: {str(e)}")
             return []
@@ -345,13 +738,26 @@ class FirestoreDatabase(DatabaseInterface):
 class DatabaseService:
     """Main database service with automatic fallback"""
     
+    # Concurrent save_document calls are coalesced into one bulk write of up to
+    # SAVE_BATCH_SIZE documents, waiting at most SAVE_BATCH_WINDOW seconds for company
+    SAVE_BATCH_SIZE = 256
+    SAVE_BATCH_WINDOW = 0.005
+    
     def __init__(self):
         self.primary_db = None
         self.fallback_db = None
         self.current_db = None
+        self._save_queue: Optional[asyncio.Queue] = None
+        self._save_task: Optional[asyncio.Task] = None
         
     async def initialize(self):
         """Initialize database with fallback strategy"""
+        await self._select_backend()
+        self._save_queue = asyncio.Queue()
+        self._save_task = asyncio.create_task(self._save_batcher())
+    
+    async def _select_backend(self):
+        """Pick PostgreSQL, else Firestore"""
         # Try PostgreSQL first
         if ASYNCPG_AVAILABLE and os.getenv("DATABASE_URL"):
             try:
@@ -378,16 +784,100 @@ class DatabaseService:
         raise RuntimeError("No database backend available")
     
     async def save_document(self, document: Document) -> bool:
-        """Save document using current database"""
-        return await self.current_db.save_document(document)
+        """Save document using current database (batched with concurrent saves)"""
+        if self._save_task is None or self._save_task.done():
+            return await self.current_db.save_document(document)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._save_queue.put_nowait((document, future))
+        return await future
+    
+    async def save_documents_bulk(self, documents: List[Document]) -> bool:
+        """Save several documents in one batched write"""
+        return await self.current_db.save_documents_bulk(documents)
+    
+    async def _save_batcher(self):
+        """Background task: flush queued saves as bulk writes"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._save_queue.get()]
+            deadline = loop.time() + self.SAVE_BATCH_WINDOW
+            while len(batch) < self.SAVE_BATCH_SIZE:
+                if not self._save_queue.empty():
+                    batch.append(self._save_queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._save_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush_saves(batch)
+    
+    async def _flush_saves(self, batch: List[Tuple[Document, asyncio.Future]]):
+        """Write one batch and resolve each caller's future"""
+        documents = [document for document, _ in batch]
+        try:
+            if len(documents) == 1:
+                results = [await self.current_db.save_document(documents[0])]
+            elif await self.current_db.save_documents_bulk(documents):
+                results = [True] * len(documents)
+            else:
+                # One bad row fails the whole transaction; retry individually so the rest still land
+                results = [await self.current_db.save_document(document) for document in documents]
+        except Exception as e:
+            logger.error(f"Batched document save failed: {str(e)}")
+            results = [False] * len(documents)
+        
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
     
     async def get_document(self, document_id: str) -> Optional[Document]:
         """Get document using current database"""
         return await self.current_db.get_document(document_id)
     
-    async def list_documents(self, user_id: Optional[str] = None, limit: int = 100) -> List[Document]:
-        """List documents using current database"""
-        return await self.current_db.list_documents(user_id, limit)
+    async def list_documents(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> List[DocumentMeta]:
+        """List document metadata using current database (keyset-paged with ``before``/``before_id``)"""
+        return await self.current_db.list_documents(user_id, limit, before, before_id)
+    
+    def iter_documents(
+        self,
+        user_id: Optional[str] = None,
+        before: Optional[datetime] = None,
+        batch_size: int = 200
+    ) -> AsyncIterator[DocumentMeta]:
+        """Stream document metadata without materializing the whole result"""
+        return self.current_db.iter_documents(user_id, before, batch_size)
+    
+    async def count_documents(self, user_id: Optional[str] = None) -> int:
+        """Count documents using current database"""
+        return await self.current_db.count_documents(user_id)
+    
+    async def aggregate_stats(self, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Document statistics using current database"""
+        return await self.current_db.aggregate_stats(user_id)
+    
+    async def list_and_count(
+        self,
+        user_id: Optional[str] = None,
+        limit: int = 100,
+        before: Optional[datetime] = None,
+        before_id: Optional[str] = None
+    ) -> Tuple[List[DocumentMeta], int]:
+        """A (keyset) page of document metadata plus the total, queried concurrently"""
+        documents, total = await asyncio.gather(
+            self.current_db.list_documents(user_id, limit, before, before_id),
+            self.current_db.count_documents(user_id)
+        )
+        return documents, total
     
     async def delete_document(self, document_id: str) -> bool:
         """Delete document using current database"""
@@ -397,7 +887,13 @@ class DatabaseService:
         """Update document using current database"""
         return await self.current_db.update_document(document)
     
-    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[Document]:
+    async def append_chat_messages(self, document_id: str, messages: List[ChatMessage]) -> bool:
+        """Append to a document's chat history using current database"""
+        if not messages:
+            return True
+        return await self.current_db.append_chat_messages(document_id, messages)
+    
+    async def search_documents(self, query: str, user_id: Optional[str] = None) -> List[DocumentMeta]:
         """Search documents using current database"""
         return await self.current_db.search_documents(query, user_id)
     
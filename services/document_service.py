@@ -1,10 +1,15 @@
 import os
-import fitz  # PyMuPDF
+import asyncio
 from docx import Document as DocxDocument
-from typing import List, Optional, Union
-from models import Document, Language
+from typing import BinaryIO, List, Optional, Union
+from models import Document, DocumentMeta, Language
 from services.storage_service import StorageService
 from services.mock_storage_service import MockStorageService
+from services.executors import cpu_executor, PROCESS_PARSE_MIN_BYTES
+from services.text_extraction import (
+    content_digest, detect_language, extract_large_pdf_text, extract_pdf_text, extraction_cache,
+    join_stripped, leading_lines, read_text_file
+)
 
 class DocumentService:
     """Service for handling document operations"""
@@ -17,13 +22,45 @@ class DocumentService:
             self.storage_service = storage_service
 
     async def process_document(self, file_path: str, document_id: str, filename: str, user_id: Optional[str] = None) -> Document:
-        """Process and store a document"""
+        """Process and store a document saved at ``file_path``"""
+        return await self._process_source(file_path, os.path.getsize(file_path), document_id, filename, user_id)
+
+    async def process_document_from_fileobj(self, fileobj: BinaryIO, document_id: str, filename: str, user_id: Optional[str] = None) -> Document:
+        """Process and store a document from an open binary file object (e.g. a spooled upload)"""
+        fileobj.seek(0, os.SEEK_END)
+        file_size = fileobj.tell()
+        fileobj.seek(0)
+        return await self._process_source(fileobj, file_size, document_id, filename, user_id)
+
+    async def _process_source(
+        self,
+        source: Union[str, BinaryIO],
+        file_size: int,
+        document_id: str,
+        filename: str,
+        user_id: Optional[str] = None
+    ) -> Document:
+        """Extract, build and store a document from a path or file object"""
         try:
-            # Extract text based on file type
-            content = self._extract_text_from_file(file_path, filename)
-
-            # Detect language
-            detected_language = self._detect_language(content)
+            # Extract text based on file type (CPU and disk bound, so off the event loop)
+            loop = asyncio.get_event_loop()
+            file_type = self._get_file_type(filename)
+
+            # Re-uploads of an identical file reuse the earlier extraction
+            cache_key = f"{file_type}:{await loop.run_in_executor(cpu_executor, content_digest, source)}"
+            cached = extraction_cache.get(cache_key)
+            if cached is not None:
+                content, detected_language = cached
+            else:
+                if isinstance(source, str) and file_type == "pdf" and file_size >= PROCESS_PARSE_MIN_BYTES:
+                    # Large PDFs on disk parse in a worker process so they don't hold the GIL here
+                    content = await extract_large_pdf_text(source)
+                else:
+                    content = await loop.run_in_executor(cpu_executor, self._extract_text_from_file, source, filename)
+
+                # Detect language
+                detected_language = self._detect_language(content)
+                extraction_cache.put(cache_key, content, detected_language)
 
             # Extract title from content (first line or filename)
             title = self._extract_title(content, filename)
@@ -37,21 +74,23 @@ class DocumentService:
                 user_id=user_id,
                 detected_language=detected_language,
                 meta={
-                    "file_size": os.path.getsize(file_path),
+                    "file_size": file_size,
                     "file_type": self._get_file_type(filename)
                 }
             )
 
             # Store document
-            await self.storage_service.store_document(document, file_path)
+            if not isinstance(source, str):
+                source.seek(0)
+            await self.storage_service.store_document(document, source)
 
             return document
 
         except Exception as e:
             raise Exception(f"Error processing document: {str(e)}")
 
-    def _extract_text_from_file(self, file_path: str, filename: str) -> str:
-        """Extract text from different file types"""
+    def _extract_text_from_file(self, file_path: Union[str, BinaryIO], filename: str) -> str:
+        """Extract text from different file types (path or binary file object)"""
         file_extension = filename.lower().split('.')[-1]
 
         if file_extension == 'pdf':
@@ -67,62 +106,32 @@ class DocumentService:
             except:
                 raise Exception(f"Unsupported file type: {file_extension}")
 
-    def _extract_text_from_pdf(self, file_path: str) -> str:
+    def _extract_text_from_pdf(self, file_path: Union[str, BinaryIO]) -> str:
         """Extract text from PDF using PyMuPDF"""
         try:
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text.strip()
+            return extract_pdf_text(file_path)
         except Exception as e:
             raise Exception(f"Error extracting text from PDF: {str(e)}")
 
-    def _extract_text_from_docx(self, file_path: str) -> str:
+    def _extract_text_from_docx(self, file_path: Union[str, BinaryIO]) -> str:
         """Extract text from DOCX file"""
         try:
             doc = DocxDocument(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return join_stripped([paragraph.text for paragraph in doc.paragraphs], "\n")
         except Exception as e:
             raise Exception(f"Error extracting text from DOCX: {str(e)}")
 
-    def _extract_text_from_txt(self, file_path: str) -> str:
+    def _extract_text_from_txt(self, file_path: Union[str, BinaryIO]) -> str:
         """Extract text from TXT file"""
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read().strip()
-        except UnicodeDecodeError:
-            # Try with different encoding
-            with open(file_path, "r", encoding="latin-1") as f:
-                return f.read().strip()
+        return read_text_file(file_path)
 
     def _detect_language(self, text: str) -> Language:
         """Detect language of text"""
-        try:
-            from langdetect import detect
-            lang_code = detect(text)
-            # Map language codes to our Language enum
-            lang_map = {
-                "en": Language.ENGLISH,
-                "te": Language.TELUGU,
-                "hi": Language.HINDI,
-                "es": Language.SPANISH,
-                "fr": Language.FRENCH,
-                "de": Language.GERMAN
-            }
-            return lang_map.get(lang_code, Language.ENGLISH)
-        except:
-            return Language.ENGLISH
+        return detect_language(text)
 
     def _extract_title(self, content: str, filename: str) -> str:
         """Extract title from content or use filename"""
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
+        for line in leading_lines(content):
             if line and len(line) < 100:  # Reasonable title length
                 return line
         # Fallback to filename without extension
@@ -139,14 +148,10 @@ class DocumentService:
         except Exception as e:
             raise Exception(f"Error getting document: {str(e)}")
 
-    async def list_documents(self, user_id: Optional[str] = None) -> List[Document]:
-        """List documents (optionally filtered by user)"""
+    async def list_documents(self, user_id: Optional[str] = None) -> List[DocumentMeta]:
+        """List document metadata (optionally filtered by user)"""
         try:
-            all_documents = await self.storage_service.list_documents()
-            if user_id:
-                # Filter documents by user_id
-                return [doc for doc in all_documents if doc.user_id == user_id]
-            return all_documents
+            return await self.storage_service.list_documents(user_id=user_id)
         except Exception as e:
             raise Exception(f"Error listing documents: {str(e)}")
 
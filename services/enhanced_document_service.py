@@ -5,33 +5,65 @@ Enhanced document service with database integration, caching, and advanced featu
 
 import os
 import uuid
+import base64
 import asyncio
-from typing import List, Optional, Dict, Any
+from typing import BinaryIO, List, Optional, Dict, Any, Tuple
 from fastapi import UploadFile, HTTPException
 import logging
 from datetime import datetime
 import mimetypes
-import hashlib
+import shutil
+import tempfile
+from pathlib import Path
 
 # Document processing imports
-import fitz  # PyMuPDF
 from docx import Document as DocxDocument
-from langdetect import detect
 
 # Internal services
-from models import Document, Language
+from models import ChatMessage, Document, DocumentMeta, Language
 from services.database_service import DatabaseService
-from services.cache_service import cache_service, generate_cache_key
+from services.cache_service import InMemoryCache, cache_service, generate_cache_key
 from services.secret_manager import secret_manager
+from services.executors import cpu_executor, PROCESS_PARSE_MIN_BYTES
+from services.text_extraction import (
+    content_digest, detect_language, extract_large_pdf_text, extract_pdf_text, extraction_cache,
+    join_stripped, leading_lines, read_text_file
+)
 
 logger = logging.getLogger(__name__)
 
+# Largest accepted upload; also enforced on the raw request body by BodySizeLimitMiddleware
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Large uploads are copied to disk in pieces of this size, so peak memory stays flat
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+def encode_page_cursor(document: DocumentMeta) -> str:
+    """Opaque listing cursor pointing just after ``document`` (newest-first order)"""
+    raw = f"{document.created_at.isoformat()}|{document.document_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_page_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+    """(created_at, document_id) keyset from a cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, document_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), document_id
+    except (ValueError, UnicodeDecodeError):
+        return None
+
 class EnhancedDocumentService:
     """Enhanced document service with database, caching, and advanced features"""
     
+    # Hot documents kept in-process in front of the shared cache; other workers' deletes
+    # evict them through cache invalidation broadcasts, the TTL covers missed broadcasts
+    DOCUMENT_L1_SIZE = int(os.getenv("DOCUMENT_L1_SIZE", "256"))
+    DOCUMENT_L1_TTL = int(os.getenv("DOCUMENT_L1_TTL", "60"))
+    
     def __init__(self):
         self.database = DatabaseService()
-        self.max_file_size = 50 * 1024 * 1024  # 50MB
+        self._documents = InMemoryCache(max_size=self.DOCUMENT_L1_SIZE)
+        self.max_file_size = MAX_UPLOAD_BYTES
         self.supported_types = {
             'pdf': 'application/pdf',
             'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
@@ -44,6 +76,8 @@ class EnhancedDocumentService:
     async def initialize(self):
         """Initialize the service"""
         await self.database.initialize()
+        await self._documents.initialize()
+        cache_service.on_invalidation(self._documents.delete_many)
         logger.info("Enhanced document service initialized")
     
     async def upload_and_process_document(
@@ -59,20 +93,23 @@ class EnhancedDocumentService:
         # Generate document ID
         document_id = str(uuid.uuid4())
         
-        # Create temporary file
-        temp_file_path = f"/tmp/{document_id}_{file.filename}"
-        
         try:
-            # Save uploaded file
-            with open(temp_file_path, "wb") as temp_file:
-                content = await file.read()
-                temp_file.write(content)
+            # Parse straight from the upload's spooled file; only large PDFs are written to disk
+            def hash_upload():
+                file.file.seek(0, os.SEEK_END)
+                file_size = file.file.tell()
+                return content_digest(file.file), file_size
+            
+            loop = asyncio.get_event_loop()
+            file_hash, file_size = await loop.run_in_executor(None, hash_upload)
             
             # Process document
             document = await self._process_document_file(
-                temp_file_path,
+                file.file,
                 document_id,
                 file.filename,
+                file_hash,
+                file_size,
                 user_id
             )
             
@@ -90,25 +127,25 @@ class EnhancedDocumentService:
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Document processing failed: {str(e)}")
-        
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
     
     async def get_document(self, document_id: str, user_id: Optional[str] = None) -> Optional[Document]:
         """Get document with caching and user validation"""
         
-        # Try cache first
+        # In-process copy first, then the shared cache
         cache_key = generate_cache_key("document", document_id)
-        cached_doc = await cache_service.get(cache_key)
-        
-        if cached_doc:
-            document = Document(**cached_doc)
+        document = await self._documents.get(cache_key)
+        if document is None:
+            cached_doc = await cache_service.get(cache_key)
+            if cached_doc:
+                document = Document(**cached_doc)
+                await self._documents.set(cache_key, document, self.DOCUMENT_L1_TTL)
+        
+        if document is not None:
             # Validate user access
             if user_id and document.user_id != user_id:
                 return None
-            return document
+            # Callers may mutate what they get back (e.g. chat_history), never the cached copy
+            return document.model_copy(deep=True)
         
         # Get from database
         document = await self.database.get_document(document_id)
@@ -127,38 +164,38 @@ class EnhancedDocumentService:
         self,
         user_id: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
-    ) -> List[Document]:
-        """List documents with pagination and caching"""
+        cursor: Optional[str] = None
+    ) -> Tuple[List[DocumentMeta], int]:
+        """
+        A page of document metadata newest first, continuing after ``cursor`` (see
+        encode_page_cursor), and the total number of documents
+        """
+        before, before_id = (decode_page_cursor(cursor) if cursor else None) or (None, None)
         
         # Try cache for user-specific lists
+        cache_key = generate_cache_key("user_documents_page", user_id, limit, cursor) if user_id else None
         if user_id:
-            cache_key = generate_cache_key("user_documents", user_id, limit, offset)
-            cached_docs = await cache_service.get(cache_key)
-            if cached_docs:
-                return [Document(**doc) for doc in cached_docs]
+            cached_page = await cache_service.get(cache_key)
+            if cached_page:
+                return [DocumentMeta(**doc) for doc in cached_page["documents"]], cached_page["total"]
         
-        # Get from database
-        documents = await self.database.list_documents(user_id, limit)
-        
-        # Apply offset (database service should handle this, but fallback)
-        if offset > 0:
-            documents = documents[offset:]
+        # Keyset page and count run concurrently; the page seeks straight past the cursor
+        documents, total = await self.database.list_and_count(user_id, limit, before, before_id)
         
         # Cache user-specific lists
         if user_id and documents:
-            cache_key = generate_cache_key("user_documents", user_id, limit, offset)
-            doc_dicts = [doc.dict() for doc in documents]
-            await cache_service.set(cache_key, doc_dicts, ttl=300)  # 5 minutes
+            page = {"documents": [doc.model_dump() for doc in documents], "total": total}
+            # Tagged per user so every page size/cursor is invalidated together
+            await cache_service.set_tagged(cache_key, page, 300, f"user_documents:{user_id}")  # 5 minutes
         
-        return documents
+        return documents, total
     
     async def search_documents(
         self,
         query: str,
         user_id: Optional[str] = None,
         limit: int = 50
-    ) -> List[Document]:
+    ) -> List[DocumentMeta]:
         """Search documents with caching"""
         
         # Cache search results
@@ -166,7 +203,7 @@ class EnhancedDocumentService:
         cached_results = await cache_service.get(cache_key)
         
         if cached_results:
-            return [Document(**doc) for doc in cached_results]
+            return [DocumentMeta(**doc) for doc in cached_results]
         
         # Search in database
         documents = await self.database.search_documents(query, user_id)
@@ -210,10 +247,22 @@ class EnhancedDocumentService:
         success = await self.database.update_document(document)
         
         if success:
-            # Update cache
-            await self._cache_document(document)
-            # Invalidate related caches
+            # Evict related caches (and other workers' copies), then cache the new version
             await self._invalidate_document_caches(document.document_id, document.user_id)
+            await self._cache_document(document)
+        
+        return success
+    
+    async def append_chat_messages(self, document_id: str, messages: List[ChatMessage]) -> bool:
+        """Record chat turns without rewriting the document body (the query endpoints don't persist chat yet)"""
+        
+        success = await self.database.append_chat_messages(document_id, messages)
+        
+        if success:
+            # Listings and stats don't carry chat history; only the cached document is stale
+            document_key = generate_cache_key("document", document_id)
+            await self._documents.delete(document_key)
+            await cache_service.delete(document_key)
         
         return success
     
@@ -226,34 +275,8 @@ class EnhancedDocumentService:
         if cached_stats:
             return cached_stats
         
-        # Get documents
-        documents = await self.list_documents(user_id, limit=10000)  # Get all for stats
-        
-        # Calculate statistics
-        stats = {
-            "total_documents": len(documents),
-            "total_size": sum(doc.meta.get("file_size", 0) for doc in documents),
-            "file_types": {},
-            "languages": {},
-            "recent_uploads": 0
-        }
-        
-        # Count by file type and language
-        for doc in documents:
-            file_type = doc.meta.get("file_type", "unknown")
-            stats["file_types"][file_type] = stats["file_types"].get(file_type, 0) + 1
-            
-            language = doc.detected_language or "unknown"
-            stats["languages"][language] = stats["languages"].get(language, 0) + 1
-            
-            # Count recent uploads (last 24 hours)
-            if doc.created_at:
-                try:
-                    created_time = datetime.fromisoformat(doc.created_at.replace('Z', '+00:00'))
-                    if (datetime.now(created_time.tzinfo) - created_time).days < 1:
-                        stats["recent_uploads"] += 1
-                except:
-                    pass
+        # Aggregated by the database; only the totals come back
+        stats = await self.database.aggregate_stats(user_id)
         
         # Cache statistics
         await cache_service.set(cache_key, stats, ttl=1800)  # 30 minutes
@@ -264,7 +287,7 @@ class EnhancedDocumentService:
         """Validate uploaded file"""
         
         # Check file size
-        if hasattr(file, 'size') and file.size > self.max_file_size:
+        if getattr(file, 'size', None) is not None and file.size > self.max_file_size:
             raise HTTPException(
                 status_code=413,
                 detail=f"File too large. Maximum size is {self.max_file_size // (1024*1024)}MB"
@@ -278,31 +301,39 @@ class EnhancedDocumentService:
                 detail=f"Unsupported file type. Supported types: {list(self.supported_types.keys())}"
             )
         
-        # Validate filename
+        # Validate filename (it ends up in storage paths, so no directory parts)
         if not file.filename or len(file.filename) > 255:
             raise HTTPException(status_code=400, detail="Invalid filename")
+        if os.path.basename(file.filename.replace("\\", "/")) != file.filename or file.filename in (".", ".."):
+            raise HTTPException(status_code=400, detail="Invalid filename")
     
     async def _process_document_file(
         self,
-        file_path: str,
+        source: BinaryIO,
         document_id: str,
         filename: str,
+        file_hash: str,
+        file_size: int,
         user_id: Optional[str] = None
     ) -> Document:
-        """Process document file and extract content"""
-        
-        # Extract text content
-        content = await self._extract_text_from_file(file_path, filename)
-        
-        # Detect language
-        detected_language = self._detect_language(content)
+        """Process document file and extract content (``file_hash`` is the digest of its bytes)"""
+        
+        # Re-uploads of an identical file reuse the earlier extraction
+        cache_key = f"{self._get_file_type(filename)}:{file_hash}"
+        cached = extraction_cache.get(cache_key)
+        if cached is not None:
+            content, detected_language = cached
+        else:
+            # Extract text content
+            content = await self._extract_text_from_file(source, filename, file_size)
+            
+            # Detect language
+            detected_language = self._detect_language(content)
+            extraction_cache.put(cache_key, content, detected_language)
         
         # Extract title
         title = self._extract_title(content, filename)
         
-        # Get file metadata
-        file_stats = os.stat(file_path)
-        
         # Create document
         document = Document(
             document_id=document_id,
@@ -312,92 +343,77 @@ class EnhancedDocumentService:
             user_id=user_id,
             detected_language=detected_language,
             meta={
-                "file_size": file_stats.st_size,
+                "file_size": file_size,
                 "file_type": self._get_file_type(filename),
-                "content_hash": self._calculate_content_hash(content),
+                # blake2b-16 of the uploaded bytes; older documents carry content_hash, sha256 of the text
+                "file_digest": file_hash,
                 "processing_time": datetime.utcnow().isoformat()
             }
         )
         
         return document
     
-    async def _extract_text_from_file(self, file_path: str, filename: str) -> str:
+    async def _extract_text_from_file(self, source: BinaryIO, filename: str, file_size: int) -> str:
         """Extract text from file based on type"""
         
         file_extension = filename.lower().split('.')[-1]
+        source.seek(0)
         
         try:
             if file_extension == 'pdf':
-                return await self._extract_text_from_pdf(file_path)
+                return await self._extract_text_from_pdf(source, file_size)
             elif file_extension in ['docx', 'doc']:
-                return await self._extract_text_from_docx(file_path)
+                return await self._extract_text_from_docx(source)
             elif file_extension in ['txt', 'md']:
-                return await self._extract_text_from_txt(file_path)
+                return await self._extract_text_from_txt(source)
             else:
                 # Try as text file
-                return await self._extract_text_from_txt(file_path)
+                return await self._extract_text_from_txt(source)
                 
         except Exception as e:
             logger.error(f"Error extracting text from {filename}: {str(e)}")
             raise HTTPException(status_code=422, detail=f"Could not extract text from file: {str(e)}")
     
-    async def _extract_text_from_pdf(self, file_path: str) -> str:
+    async def _extract_text_from_pdf(self, source: BinaryIO, file_size: int) -> str:
         """Extract text from PDF using PyMuPDF"""
-        def extract():
-            doc = fitz.open(file_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            return text.strip()
-        
-        # Run in thread pool to avoid blocking
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, extract)
+        if file_size < PROCESS_PARSE_MIN_BYTES:
+            # Parsed from memory on a worker thread
+            return await loop.run_in_executor(cpu_executor, extract_pdf_text, source)
+        
+        # Large files go to worker processes so parsing doesn't hold the GIL; they need a path
+        def spill():
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+                shutil.copyfileobj(source, temp_file, length=UPLOAD_CHUNK_SIZE)
+                return temp_file.name
+        
+        temp_file_path = await loop.run_in_executor(None, spill)
+        try:
+            return await extract_large_pdf_text(temp_file_path)
+        finally:
+            Path(temp_file_path).unlink(missing_ok=True)
     
-    async def _extract_text_from_docx(self, file_path: str) -> str:
+    async def _extract_text_from_docx(self, source: BinaryIO) -> str:
         """Extract text from DOCX file"""
         def extract():
-            doc = DocxDocument(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            doc = DocxDocument(source)
+            return join_stripped([paragraph.text for paragraph in doc.paragraphs], "\n")
         
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, extract)
+        return await loop.run_in_executor(cpu_executor, extract)
     
-    async def _extract_text_from_txt(self, file_path: str) -> str:
+    async def _extract_text_from_txt(self, source: BinaryIO) -> str:
         """Extract text from text file"""
-        def extract():
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return f.read().strip()
-            except UnicodeDecodeError:
-                with open(file_path, "r", encoding="latin-1") as f:
-                    return f.read().strip()
-        
         loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, extract)
+        return await loop.run_in_executor(cpu_executor, read_text_file, source)
     
     def _detect_language(self, text: str) -> str:
         """Detect language of text"""
-        try:
-            lang_code = detect(text)
-            # Map to supported languages
-            lang_map = {
-                "en": "en", "te": "te", "hi": "hi",
-                "es": "es", "fr": "fr", "de": "de"
-            }
-            return lang_map.get(lang_code, "en")
-        except:
-            return "en"
+        return detect_language(text).value
     
     def _extract_title(self, content: str, filename: str) -> str:
         """Extract title from content or filename"""
-        lines = content.split('\n')
-        for line in lines:
-            line = line.strip()
+        for line in leading_lines(content):
             if line and len(line) < 100 and len(line) > 3:
                 return line
         
@@ -408,30 +424,27 @@ class EnhancedDocumentService:
         """Get file type from filename"""
         return filename.lower().split('.')[-1] if '.' in filename else 'unknown'
     
-    def _calculate_content_hash(self, content: str) -> str:
-        """Calculate hash of content for deduplication"""
-        return hashlib.sha256(content.encode()).hexdigest()
-    
     async def _cache_document(self, document: Document):
         """Cache document for quick access"""
         cache_key = generate_cache_key("document", document.document_id)
+        await self._documents.set(cache_key, document.model_copy(deep=True), self.DOCUMENT_L1_TTL)
         await cache_service.set(cache_key, document.dict(), ttl=3600)  # 1 hour
     
     async def _invalidate_document_caches(self, document_id: str, user_id: Optional[str]):
         """Invalidate related caches when document changes"""
         
-        # Invalidate document cache
-        cache_key = generate_cache_key("document", document_id)
-        await cache_service.delete(cache_key)
-        
-        # Invalidate user document lists (approximate)
+        # Document and statistics keys in one round trip
+        document_key = generate_cache_key("document", document_id)
+        await self._documents.delete(document_key)
+        stale_keys = [document_key, generate_cache_key("doc_stats", user_id or "global")]
+        invalidations = [
+            cache_service.delete_many(stale_keys),
+            # Cached AI answers about this document
+            cache_service.invalidate_ai_responses(document_id)
+        ]
+        
+        # Every cached page of the user's document list, whatever its limit/cursor
         if user_id:
-            # This is a simple approach - in production, use cache tags
-            for limit in [10, 50, 100]:
-                for offset in [0, 10, 50]:
-                    cache_key = generate_cache_key("user_documents", user_id, limit, offset)
-                    await cache_service.delete(cache_key)
-        
-        # Invalidate statistics
-        stats_key = generate_cache_key("doc_stats", user_id or "global")
-        await cache_service.delete(stats_key)
+            invalidations.append(cache_service.invalidate_tag(f"user_documents:{user_id}"))
+        
+        await asyncio.gather(*invalidations)
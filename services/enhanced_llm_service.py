@@ -78,34 +78,35 @@ class EnhancedLLMService:
             # Generate cache key
             cache_key = self._generate_cache_key("query", request)
             
-            # Try cache first
-            cached_response = await cache_service.get_cached_ai_response(cache_key)
-            if cached_response:
-                monitoring_service.log_cache_hit("ai_query", True)
-                monitoring_service.log_ai_query("query", True, time.time() - start_time)
-                return QueryResponse(**cached_response)
-            
-            monitoring_service.log_cache_hit("ai_query", False)
-            
-            # Get document
-            document = await self._get_document(request.document_id)
-            if not document:
-                raise ValueError("Document not found")
+            computed = False
             
-            # Process query
-            if self.use_real_ai and self.model:
-                response = await self._process_real_query(request, document)
-            else:
-                response = await self._process_mock_query(request, document)
+            async def compute() -> Dict[str, Any]:
+                nonlocal computed
+                computed = True
+                
+                # Get document
+                document = await self._get_document(request.document_id)
+                if not document:
+                    raise ValueError("Document not found")
+                
+                # Process query
+                if self.use_real_ai and self.model:
+                    response = await self._process_real_query(request, document)
+                else:
+                    response = await self._process_mock_query(request, document)
+                return response.dict()
             
-            # Cache response
-            await cache_service.cache_ai_response(cache_key, response.dict(), self.cache_ttl["query"])
+            # Cache first; concurrent misses for the same query share one AI call
+            response_data = await cache_service.get_or_compute_ai_response(
+                cache_key, compute, self.cache_ttl["query"], document_id=request.document_id
+            )
+            monitoring_service.log_cache_hit("ai_query", not computed)
             
             # Log metrics
             duration = time.time() - start_time
             monitoring_service.log_ai_query("query", True, duration)
             
-            return response
+            return QueryResponse(**response_data)
             
         except Exception as e:
             duration = time.time() - start_time
@@ -421,7 +422,7 @@ Respond in {getattr(request, 'target_language', 'en')}.
             **request.dict()
         }
         request_string = json.dumps(request_data, sort_keys=True)
-        return hashlib.sha256(request_string.encode()).hexdigest()
+        return hashlib.blake2b(request_string.encode(), digest_size=16).hexdigest()
     
     async def _get_document(self, document_id: str) -> Optional[Document]:
         """Get document from storage service"""
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Shared executors for CPU-bound work (document parsing, text extraction)
+"""
+
+import os
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Bounded to the CPU count so parsing many uploads at once doesn't oversubscribe the cores,
+# while the default executor stays free for blocking I/O. Threads rather than processes
+# because parsers receive open file objects and services holding cloud clients.
+CPU_WORKERS = os.cpu_count() or 1
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu-bound")
+
+# Files at least this large on disk are parsed in a worker process, where GIL-bound
+# parsing runs truly in parallel; below it the process round trip costs more than it saves
+PROCESS_PARSE_MIN_BYTES = int(os.getenv("PROCESS_PARSE_MIN_BYTES", str(10 * 1024 * 1024)))
+
+_process_executor: Optional[ProcessPoolExecutor] = None
+
+def get_process_executor() -> ProcessPoolExecutor:
+    """Process pool for large parses, started on first use"""
+    global _process_executor
+    if _process_executor is None:
+        # spawn: forking a process that already runs threads can deadlock the child
+        _process_executor = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_executor
+
+def shutdown_cpu_executor():
+    """Stop accepting CPU-bound work and release the worker threads and processes"""
+    global _process_executor
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    if _process_executor is not None:
+        _process_executor.shutdown(wait=False, cancel_futures=True)
+        _process_executor = None
+    logger.info("CPU executor shut down")
@@ -1,6 +1,10 @@
 import os
 import json
-from typing import Optional, Dict, Any
+import time
+import base64
+import asyncio
+import hashlib
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime
 import firebase_admin
 from firebase_admin import credentials, auth
@@ -12,8 +16,13 @@ logger = logging.getLogger(__name__)
 class FirebaseAuthService:
     """Service for Firebase Authentication integration"""
 
+    # Verified claims are reused for up to this many seconds (bounded by token expiry)
+    TOKEN_CACHE_TTL = 60
+    TOKEN_CACHE_MAX_SIZE = 10000
+
     def __init__(self):
         self.app = None
+        self._token_cache: Dict[bytes, Tuple[float, Dict[str, Any]]] = {}
         self.initialize_firebase()
 
     def initialize_firebase(self):
@@ -85,9 +94,17 @@ class FirebaseAuthService:
             # Mock mode for development/testing
             return self._mock_verify_token(id_token)
 
+        cache_key = hashlib.blake2b(id_token.encode(), digest_size=16).digest()
+        cached = self._token_cache.get(cache_key)
+        if cached:
+            expires_at, user_info = cached
+            if expires_at > time.time():
+                return user_info
+            del self._token_cache[cache_key]
+
         try:
-            # Verify the ID token
-            decoded_token = auth.verify_id_token(id_token)
+            # Verify the ID token off the event loop (may fetch Google's signing certificates)
+            decoded_token = await asyncio.to_thread(auth.verify_id_token, id_token)
 
             # Extract user information
             user_info = {
@@ -105,6 +122,7 @@ class FirebaseAuthService:
             }
 
             logger.info(f"Successfully verified token for user: {user_info['uid']}")
+            self._cache_verified_token(cache_key, user_info, decoded_token.get("exp"))
             return user_info
 
         except auth.InvalidIdTokenError:
@@ -126,6 +144,21 @@ class FirebaseAuthService:
                 detail="Authentication failed"
             )
 
+    def _cache_verified_token(self, cache_key: bytes, user_info: Dict[str, Any], token_exp: Optional[int]):
+        """Remember verified claims until the token expires or the cache TTL passes"""
+        now = time.time()
+        expires_at = now + self.TOKEN_CACHE_TTL
+        if token_exp:
+            # Stop serving cached claims a few seconds before the token itself expires
+            expires_at = min(expires_at, token_exp - 5)
+        if expires_at <= now:
+            return
+
+        if len(self._token_cache) >= self.TOKEN_CACHE_MAX_SIZE:
+            # Evict the oldest entry (dicts preserve insertion order)
+            self._token_cache.pop(next(iter(self._token_cache)))
+        self._token_cache[cache_key] = (expires_at, user_info)
+
     def _mock_verify_token(self, id_token: str) -> Dict[str, Any]:
         """
         Mock token verification for development/testing
@@ -199,6 +232,44 @@ class FirebaseAuthService:
             logger.error(f"Error getting user {uid}: {str(e)}")
             return None
 
+    async def warm_up(self):
+        """
+        Fetch Firebase's public signing keys before the first request needs them
+
+        Verifies a well-formed but unsigned token for this project, which makes the
+        SDK download and cache the certificates, then fails on the signature as expected.
+        """
+        if not self.app:
+            return
+
+        def encode(part: Dict[str, Any]) -> str:
+            return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+
+        now = int(time.time())
+        project_id = self.app.project_id
+        probe_token = ".".join([
+            encode({"alg": "RS256", "kid": "warm-up", "typ": "JWT"}),
+            encode({
+                "aud": project_id,
+                "iss": f"https://securetoken.google.com/{project_id}",
+                "sub": "warm-up",
+                "iat": now,
+                "exp": now + 300,
+                "auth_time": now
+            }),
+            "c2lnbmF0dXJl"
+        ])
+
+        try:
+            await asyncio.to_thread(auth.verify_id_token, probe_token)
+        except Exception:
+            # Expected: the probe has no valid signature
+            pass
+        logger.info("Firebase public keys pre-fetched")
+
     def is_initialized(self) -> bool:
         """Check if Firebase is properly initialized"""
         return self.app is not None
+
+# Global Firebase auth service instance, shared by the apps and their auth dependencies
+firebase_auth_service = FirebaseAuthService()
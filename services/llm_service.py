@@ -1,9 +1,12 @@
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
+from collections import OrderedDict
 from models import Document, QueryResponse, EmotionResponse, SummaryResponse, ChatMessage, Language
 import json
+import logging
 import os
 import re
-from langdetect import detect
+from services.text_extraction import detect_language
+from services.semantic_cache import semantic_cache, Embedding
 
 try:
     import google.generativeai as genai
@@ -11,9 +14,20 @@ try:
 except ImportError:
     GENAI_AVAILABLE = False
     genai = None
+
+logger = logging.getLogger(__name__)
+
 class LLMService:
     """Service for handling LLM operations"""
 
+    # Retrieval settings for long documents, indexed at upload time or on a worker's first query;
+    # only used with a real embedding model, token-count vectors pick chunks too poorly
+    CHUNK_SIZE = 1500
+    CHUNK_OVERLAP = 200
+    EMBED_BATCH_SIZE = 32
+    TOP_K_CHUNKS = 4
+    MAX_INDEXED_DOCUMENTS = 256
+
     def __init__(self):
         self.project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "said-eb2f5")
         self.location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
@@ -31,6 +45,9 @@ class LLMService:
         # Initialize storage service
         self.storage_service = self._get_storage_service()
 
+        # document_id -> [(chunk, embedding)], least recently used first
+        self._chunk_index: "OrderedDict[str, List[Tuple[str, Embedding]]]" = OrderedDict()
+
     def _get_storage_service(self):
         """Get appropriate storage service based on configuration"""
         use_mock_storage = os.getenv("USE_MOCK_STORAGE", "false").lower() == "true"
@@ -41,18 +58,68 @@ class LLMService:
             from services.storage_service import StorageService
             return StorageService()
 
+    def _chunk_text(self, text: str) -> List[str]:
+        """Split text into overlapping fixed-size chunks"""
+        step = self.CHUNK_SIZE - self.CHUNK_OVERLAP
+        return [text[start:start + self.CHUNK_SIZE] for start in range(0, len(text), step)]
+
+    async def index_document(self, document: Document) -> None:
+        """Chunk and embed a document once so queries only embed the question (best effort)"""
+        if not semantic_cache.has_model():
+            # Without an embedding model queries keep sending the full text
+            return
+
+        chunks = self._chunk_text(document.text)
+        if len(chunks) <= self.TOP_K_CHUNKS:
+            # Short documents are sent whole; nothing to retrieve from
+            return
+
+        try:
+            embeddings = await semantic_cache.embed_batch(chunks, batch_size=self.EMBED_BATCH_SIZE)
+        except Exception as e:
+            # Queries fall back to the full text; the document itself is already stored
+            logger.warning(f"Document indexing failed for {document.document_id}: {str(e)}")
+            return
+        self._chunk_index[document.document_id] = list(zip(chunks, embeddings))
+        self._chunk_index.move_to_end(document.document_id)
+        while len(self._chunk_index) > self.MAX_INDEXED_DOCUMENTS:
+            self._chunk_index.popitem(last=False)
+
+    def forget_document(self, document_id: str) -> None:
+        """Drop a document's chunk index"""
+        self._chunk_index.pop(document_id, None)
+
+    async def _query_context(self, document: Document, query: str) -> str:
+        """Most relevant chunks for the query in document order, or the full text if not indexed"""
+        if document.document_id not in self._chunk_index:
+            # The index is per process: workers that didn't handle the upload build it on first query
+            await self.index_document(document)
+        indexed = self._chunk_index.get(document.document_id)
+        if not indexed:
+            return document.text
+
+        self._chunk_index.move_to_end(document.document_id)
+        query_embedding = await semantic_cache.embed(query)
+        ranked = sorted(
+            range(len(indexed)),
+            key=lambda i: semantic_cache.similarity(query_embedding, indexed[i][1]),
+            reverse=True
+        )
+        return "\n...\n".join(indexed[i][0] for i in sorted(ranked[:self.TOP_K_CHUNKS]))
+
     async def query_document(
         self,
         document_id: str,
         query: str,
         query_language: Language = Language.ENGLISH,
         target_language: Language = Language.ENGLISH,
-        chat_history: Optional[List[ChatMessage]] = None
+        chat_history: Optional[List[ChatMessage]] = None,
+        document: Optional[Document] = None
     ) -> QueryResponse:
         """Query a document using natural language"""
         try:
-            # Get document content
-            document = await self.storage_service.retrieve_document(document_id)
+            # Get document content unless the caller already loaded it
+            document = document or await self.storage_service.retrieve_document(document_id)
             if not document:
                 raise Exception(f"Document {document_id} not found")
 
@@ -70,7 +137,7 @@ class LLMService:
 
             # Create prompt
             prompt = self._create_query_prompt(
-                document.text,
+                await self._query_context(document, query),
                 query,
                 query_language,
                 target_language,
@@ -106,12 +173,13 @@ class LLMService:
     async def summarize_document(
         self,
         document_id: str,
-        target_language: Language = Language.ENGLISH
+        target_language: Language = Language.ENGLISH,
+        document: Optional[Document] = None
     ) -> SummaryResponse:
         """Generate a summary of the document"""
         try:
-            # Get document content
-            document = await self.storage_service.retrieve_document(document_id)
+            # Get document content unless the caller already loaded it
+            document = document or await self.storage_service.retrieve_document(document_id)
             if not document:
                 raise Exception(f"Document {document_id} not found")
 
@@ -143,11 +211,11 @@ class LLMService:
         except Exception as e:
             raise Exception(f"Error summarizing document: {str(e)}")
 
-    async def analyze_emotion(self, document_id: str) -> EmotionResponse:
+    async def analyze_emotion(self, document_id: str, document: Optional[Document] = None) -> EmotionResponse:
         """Analyze emotional tone of the document"""
         try:
-            # Get document content
-            document = await self.storage_service.retrieve_document(document_id)
+            # Get document content unless the caller already loaded it
+            document = document or await self.storage_service.retrieve_document(document_id)
             if not document:
                 raise Exception(f"Document {document_id} not found")
 
@@ -223,20 +291,7 @@ Please analyze the emotional tone of this document and provide:
 
     def _detect_language(self, text: str) -> Language:
         """Detect language of text"""
-        try:
-            lang_code = detect(text)
-            # Map language codes to our Language enum
-            lang_map = {
-                "en": Language.ENGLISH,
-                "te": Language.TELUGU,
-                "hi": Language.HINDI,
-                "es": Language.SPANISH,
-                "fr": Language.FRENCH,
-                "de": Language.GERMAN
-            }
-            return lang_map.get(lang_code, Language.ENGLISH)
-        except:
-            return Language.ENGLISH
+        return detect_language(text)
 
     async def _update_document(self, document: Document):
         """Update document in storage"""
@@ -2,7 +2,7 @@ import os
 import json
 import shutil
 from datetime import datetime
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Union
 from models import Document
 
 class MockStorageService:
@@ -17,12 +17,16 @@ class MockStorageService:
         os.makedirs(self.metadata_dir, exist_ok=True)
         os.makedirs(self.documents_dir, exist_ok=True)
 
-    async def store_document(self, document: Document, file_path: str) -> None:
+    async def store_document(self, document: Document, file_path: Union[str, BinaryIO]) -> None:
         """Store document and its metadata"""
         try:
             # Copy document file
             doc_path = os.path.join(self.documents_dir, f"{document.document_id}_{document.filename}")
-            shutil.copy2(file_path, doc_path)
+            if isinstance(file_path, str):
+                shutil.copy2(file_path, doc_path)
+            else:
+                with open(doc_path, "wb") as f:
+                    shutil.copyfileobj(file_path, f)
 
             # Store metadata
             metadata_path = os.path.join(self.metadata_dir, f"{document.document_id}.json")
@@ -64,16 +68,18 @@ class MockStorageService:
         except Exception as e:
             raise Exception(f"Error deleting document: {str(e)}")
 
-    async def list_documents(self) -> List[Document]:
-        """List all documents"""
+    async def list_documents(self, user_id: Optional[str] = None) -> List[Document]:
+        """List all documents (only ``user_id``'s if given)"""
         try:
             documents = []
             for filename in os.listdir(self.metadata_dir):
                 if filename.endswith(".json"):
-                    document_id = filename[:-5]  # Remove .json extension
-                    doc = await self.retrieve_document(document_id)
-                    if doc:
-                        documents.append(doc)
+                    with open(os.path.join(self.metadata_dir, filename), "r", encoding="utf-8") as f:
+                        metadata = json.load(f)
+                    # Filter on the raw metadata so other users' documents are never built
+                    if user_id and metadata.get("user_id") != user_id:
+                        continue
+                    documents.append(Document(**metadata))
             return documents
 
         except Exception as e:
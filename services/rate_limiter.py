@@ -88,12 +88,12 @@ class RateLimiter:
         current_time = int(time.time())
         window_start = (current_time // rate_limit.window) * rate_limit.window
         window_key = f"{cache_key}:{window_start}"
+        reset_time = window_start + rate_limit.window
         
-        # Get current count
-        current_count = await cache_service.get(window_key) or 0
+        # Count this request and read the total in a single round trip
+        new_count = await cache_service.increment_rate_limit(window_key, rate_limit.window)
         
-        if current_count >= rate_limit.requests:
-            reset_time = window_start + rate_limit.window
+        if new_count > rate_limit.requests:
             retry_after = reset_time - current_time
             return RateLimitResult(
                 allowed=False,
@@ -102,10 +102,7 @@ class RateLimiter:
                 retry_after=retry_after
             )
         
-        # Increment counter
-        new_count = await cache_service.increment_rate_limit(window_key, rate_limit.window)
         remaining = max(0, rate_limit.requests - new_count)
-        reset_time = window_start + rate_limit.window
         
         return RateLimitResult(
             allowed=True,
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Semantic cache for AI responses: serves paraphrased queries on the same document without calling the LLM
+"""
+
+import re
+import math
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+    SentenceTransformer = None
+
+from services.cache_service import cache_service
+
+logger = logging.getLogger(__name__)
+
+Embedding = Union[List[float], Dict[str, float]]
+
+_TOKEN_RE = re.compile(r"\w+")
+
+class SemanticCache:
+    """Embedding-keyed response cache layered on the main cache service"""
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        similarity_threshold: float = 0.92,
+        max_entries: int = 100,
+        ttl: int = 3600
+    ):
+        self.model_name = model_name
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._model = None
+        # Load attempted once; a failed load isn't retried on every lookup
+        self._model_loaded = not SENTENCE_TRANSFORMERS_AVAILABLE
+
+    def _get_model(self):
+        """Load the embedding model on first use"""
+        if not self._model_loaded:
+            self._model_loaded = True
+            try:
+                self._model = SentenceTransformer(self.model_name)
+                logger.info(f"Semantic cache using embedding model {self.model_name}")
+            except Exception as e:
+                logger.warning(f"Failed to load embedding model, using token vectors: {str(e)}")
+        return self._model
+
+    def has_model(self) -> bool:
+        """Whether a real embedding model is loaded (token vectors are only a rough fallback)"""
+        return self._get_model() is not None
+
+    async def embed(self, text: str) -> Embedding:
+        """Embed text as a unit vector (dense with a model, sparse token counts otherwise)"""
+        model = self._get_model()
+        if model is not None:
+            vector = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: model.encode(text, normalize_embeddings=True)
+            )
+            return vector.tolist()
+
+        return self._token_vector(text)
+
+    async def embed_batch(self, texts: List[str], batch_size: int = 32) -> List[Embedding]:
+        """Embed many texts in one model call, ``batch_size`` at a time"""
+        model = self._get_model()
+        if model is not None:
+            vectors = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+            )
+            return [vector.tolist() for vector in vectors]
+
+        return [self._token_vector(text) for text in texts]
+
+    @staticmethod
+    def _token_vector(text: str) -> Dict[str, float]:
+        counts = Counter(_TOKEN_RE.findall(text.lower()))
+        norm = math.sqrt(sum(c * c for c in counts.values())) or 1.0
+        return {token: count / norm for token, count in counts.items()}
+
+    @staticmethod
+    def similarity(a: Embedding, b: Embedding) -> float:
+        """Cosine similarity of two unit vectors"""
+        if isinstance(a, dict) and isinstance(b, dict):
+            if len(a) > len(b):
+                a, b = b, a
+            return sum(weight * b.get(token, 0.0) for token, weight in a.items())
+        if isinstance(a, list) and isinstance(b, list) and len(a) == len(b):
+            return sum(x * y for x, y in zip(a, b))
+        return 0.0
+
+    @staticmethod
+    def _normalize(text: str) -> str:
+        return " ".join(_TOKEN_RE.findall(text.lower()))
+
+    @staticmethod
+    def _cache_key(namespace: str, *parts: Any) -> str:
+        return ":".join(["semantic_entries", namespace, *(str(part) for part in parts)])
+
+    async def lookup(self, namespace: str, key_parts: tuple, text: Optional[str] = None) -> Optional[Any]:
+        """
+        Return a cached response for text similar to ``text``
+
+        Without ``text`` this is a plain exact-key cache: the newest response stored under ``key_parts``.
+        """
+        entries = await cache_service.get_list(self._cache_key(namespace, *key_parts))
+        if not entries:
+            return None
+
+        if text is None:
+            return entries[-1]["response"]
+
+        # Token-overlap scores can't tell "is X allowed" from "is X not allowed";
+        # without a model only the same query (modulo case/punctuation) is a hit
+        if self._get_model() is None:
+            normalized = self._normalize(text)
+            for entry in reversed(entries):
+                if entry.get("normalized") == normalized:
+                    logger.debug(f"Semantic cache exact hit for {namespace}")
+                    return entry["response"]
+            return None
+
+        embedding = await self.embed(text)
+        best_score, best_response = 0.0, None
+        for entry in entries:
+            if not isinstance(entry.get("embedding"), list):
+                continue
+            score = self.similarity(embedding, entry["embedding"])
+            if score > best_score:
+                best_score, best_response = score, entry["response"]
+
+        if best_score >= self.similarity_threshold:
+            logger.debug(f"Semantic cache hit for {namespace} (similarity {best_score:.3f})")
+            return best_response
+        return None
+
+    async def store(self, namespace: str, key_parts: tuple, response: Any, text: Optional[str] = None) -> bool:
+        """Remember a response under ``key_parts``, tagged with the embedding of ``text``"""
+        embedding = None
+        if text is not None and self._get_model() is not None:
+            embedding = await self.embed(text)
+        entry = {
+            "embedding": embedding,
+            "normalized": self._normalize(text) if text is not None else None,
+            "response": response
+        }
+        # Atomic append, so workers storing at the same time don't overwrite each other's entries
+        return await cache_service.append_capped(
+            self._cache_key(namespace, *key_parts), entry, self.max_entries, self.ttl
+        )
+
+# Global semantic cache instance
+semantic_cache = SemanticCache()
@@ -1,10 +1,23 @@
 import os
 import json
+import asyncio
 import logging
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 from google.cloud import storage
 from google.cloud.exceptions import NotFound, GoogleCloudError
-from models import Document
+from models import Document, DocumentMeta
+
+try:
+    from google.cloud.storage import transfer_manager
+    TRANSFER_MANAGER_AVAILABLE = True
+except ImportError:
+    TRANSFER_MANAGER_AVAILABLE = False
+    transfer_manager = None
+
+# Files at least this large are uploaded as concurrent multipart chunks
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MULTIPART_MAX_WORKERS = 8
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -34,8 +47,14 @@ class StorageService:
             logger.error(f"Failed to initialize StorageService: {str(e)}")
             raise Exception(f"Storage service initialization failed: {str(e)}")
 
-    async def store_document(self, document: Document, file_path: str):
+    async def store_document(self, document: Document, file_path: Union[str, BinaryIO]):
         """Store document in Google Cloud Storage"""
+        # GCS uploads are blocking; run them in a worker thread
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._store_document_sync, document, file_path)
+
+    def _store_document_sync(self, document: Document, file_path: Union[str, BinaryIO]):
+        """Upload the file, extracted text and metadata blobs"""
         try:
             # Upload the actual file
             file_blob_name = f"documents/{document.document_id}/{document.filename}"
@@ -43,16 +62,36 @@ class StorageService:
 
             # Upload file with proper content type
             content_type = self._get_content_type(document.filename)
-            file_blob.upload_from_filename(file_path, content_type=content_type)
+            if not isinstance(file_path, str):
+                # Small uploads arrive as in-memory spooled file objects
+                file_blob.upload_from_file(file_path, content_type=content_type, rewind=True)
+            elif TRANSFER_MANAGER_AVAILABLE and os.path.getsize(file_path) >= MULTIPART_THRESHOLD:
+                # Large files go up as parallel XML multipart chunks
+                transfer_manager.upload_chunks_concurrently(
+                    file_path,
+                    file_blob,
+                    content_type=content_type,
+                    chunk_size=MULTIPART_CHUNK_SIZE,
+                    max_workers=MULTIPART_MAX_WORKERS
+                )
+            else:
+                file_blob.upload_from_filename(file_path, content_type=content_type)
 
             logger.info(f"Uploaded file: {file_blob_name}")
 
+            # Store extracted text separately so listings only read the small metadata blob
+            text_blob = self.bucket.blob(self._text_blob_name(document.document_id))
+            text_blob.upload_from_string(document.text, content_type="text/plain; charset=utf-8")
+
             # Store metadata as JSON
             metadata_blob_name = f"documents/{document.document_id}/metadata.json"
             metadata_blob = self.bucket.blob(metadata_blob_name)
+            if document.user_id:
+                # Returned by blob listings, so per-user listings can skip other users' metadata unread
+                metadata_blob.metadata = {"user_id": document.user_id}
 
             # Convert document to JSON
-            metadata_json = json.dumps(document.model_dump(), default=str, indent=2)
+            metadata_json = json.dumps(document.model_dump(exclude={"text"}), default=str, indent=2)
             metadata_blob.upload_from_string(metadata_json, content_type="application/json")
 
             logger.info(f"Stored document metadata: {metadata_blob_name}")
@@ -78,6 +117,11 @@ class StorageService:
             metadata_json = metadata_blob.download_as_string()
             metadata = json.loads(metadata_json)
 
+            # Documents stored before the text split still carry text inline
+            if "text" not in metadata:
+                text_blob = self.bucket.blob(self._text_blob_name(document_id))
+                metadata["text"] = text_blob.download_as_bytes().decode("utf-8")
+
             logger.info(f"Retrieved document metadata: {document_id}")
             return Document(**metadata)
 
@@ -126,8 +170,8 @@ class StorageService:
         except Exception as e:
             raise Exception(f"Error retrieving document text: {str(e)}")
 
-    async def list_documents(self) -> list:
-        """List all documents in Google Cloud Storage"""
+    async def list_documents(self, user_id: Optional[str] = None) -> list:
+        """List metadata for all documents in Google Cloud Storage (only ``user_id``'s if given)"""
         try:
             documents = []
             blobs = self.bucket.list_blobs(prefix="documents/")
@@ -140,18 +184,24 @@ class StorageService:
                     path_parts = blob.name.split("/")
                     if len(path_parts) >= 3:
                         doc_id = path_parts[1]
+                        owner = (blob.metadata or {}).get("user_id")
+                        if user_id and owner is not None and owner != user_id:
+                            continue
                         try:
                             metadata_json = blob.download_as_string()
                             metadata = json.loads(metadata_json)
+                            # Blobs written before the owner was recorded are checked after download
+                            if user_id and metadata.get("user_id") != user_id:
+                                continue
                             doc_metadata[doc_id] = metadata
                         except Exception as e:
                             logger.warning(f"Error loading document {doc_id}: {str(e)}")
                             continue
 
-            # Convert metadata to Document objects
+            # Convert metadata to DocumentMeta objects; text stays in storage
             for doc_id, metadata in doc_metadata.items():
                 try:
-                    documents.append(Document(**metadata))
+                    documents.append(DocumentMeta(**metadata))
                 except Exception as e:
                     logger.warning(f"Error creating Document object for {doc_id}: {str(e)}")
                     continue
@@ -170,6 +220,10 @@ class StorageService:
         """Retrieve document (alias for get_document for compatibility)"""
         return await self.get_document(document_id)
 
+    def _text_blob_name(self, document_id: str) -> str:
+        """Blob holding a document's extracted text"""
+        return f"documents/{document_id}/text.txt"
+
     def _get_content_type(self, filename: str) -> str:
         """Get content type based on file extension"""
         extension = filename.lower().split('.')[-1] if '.' in filename else ''
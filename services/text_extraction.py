@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Text extraction and language detection shared by the document services
+"""
+
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, BinaryIO, List, Optional, Tuple, Union
+
+import fitz  # PyMuPDF
+
+from models import Language
+from services.executors import CPU_WORKERS, cpu_executor, get_process_executor
+
+try:
+    import cld3
+    CLD3_AVAILABLE = True
+except ImportError:
+    CLD3_AVAILABLE = False
+    cld3 = None
+
+try:
+    import gcld3
+    GCLD3_AVAILABLE = True
+except ImportError:
+    GCLD3_AVAILABLE = False
+    gcld3 = None
+
+# Detection accuracy saturates long before this; larger samples only cost time
+CLD3_SAMPLE_CHARS = 4096
+LANGDETECT_SAMPLE_CHARS = 1024
+
+DIGEST_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+# Plain text only: no image blocks or span/font details, no dehyphenation or ligature expansion
+PDF_TEXT_FLAGS = fitz.TEXT_PRESERVE_WHITESPACE | fitz.TEXT_PRESERVE_LIGATURES | fitz.TEXT_MEDIABOX_CLIP
+PAGE_SEPARATOR = "\x0c"
+
+# Large PDFs are split into page ranges of at least this many pages, parsed by separate
+# worker processes (MuPDF holds the GIL, so threads would not run them in parallel)
+PARALLEL_PDF_MIN_PAGES = int(os.getenv("PARALLEL_PDF_MIN_PAGES", "32"))
+
+# Titles sit at the top of a document; only this much is scanned for one
+TITLE_SCAN_CHARS = 4096
+
+def join_stripped(parts: List[str], separator: str) -> str:
+    """
+    ``separator.join(parts).strip()`` without copying the joined text a second time
+    
+    Only the outer pieces are trimmed; ``separator`` must itself be whitespace.
+    """
+    start, stop = 0, len(parts)
+    while start < stop and not parts[start].strip():
+        start += 1
+    while stop > start and not parts[stop - 1].strip():
+        stop -= 1
+    if start == stop:
+        return ""
+    parts = parts[start:stop]
+    parts[0] = parts[0].lstrip()
+    parts[-1] = parts[-1].rstrip()
+    return separator.join(parts)
+
+def extract_pdf_text(source: Union[str, BinaryIO]) -> str:
+    """Extract the text of a PDF path or binary file object (module-level so paths can run in a worker process)"""
+    if isinstance(source, str):
+        doc = fitz.open(source, filetype="pdf")
+    else:
+        doc = fitz.open(stream=source.read(), filetype="pdf")
+    with doc:
+        pages = [page.get_text("text", flags=PDF_TEXT_FLAGS) for page in doc]
+    # One join instead of growing a string page by page; pages separated by form feeds
+    return join_stripped(pages, PAGE_SEPARATOR)
+
+def pdf_page_count(file_path: str) -> int:
+    """Number of pages in a PDF on disk"""
+    with fitz.open(file_path, filetype="pdf") as doc:
+        return doc.page_count
+
+def extract_pdf_pages(file_path: str, start: int, stop: int) -> str:
+    """Text of pages ``start``..``stop - 1``; each worker opens its own document"""
+    with fitz.open(file_path, filetype="pdf") as doc:
+        return PAGE_SEPARATOR.join(
+            doc[number].get_text("text", flags=PDF_TEXT_FLAGS) for number in range(start, stop)
+        )
+
+async def extract_large_pdf_text(file_path: str) -> str:
+    """Extract a large PDF on disk in the process pool, sharding long documents by page range"""
+    loop = asyncio.get_running_loop()
+    executor = get_process_executor()
+    page_count = await loop.run_in_executor(cpu_executor, pdf_page_count, file_path)
+    shards = min(CPU_WORKERS, page_count // PARALLEL_PDF_MIN_PAGES)
+    if shards < 2:
+        return await loop.run_in_executor(executor, extract_pdf_text, file_path)
+    
+    size = -(-page_count // shards)
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(executor, extract_pdf_pages, file_path, start, min(start + size, page_count))
+        for start in range(0, page_count, size)
+    ))
+    # Same result as extract_pdf_text: pages joined by form feeds
+    return join_stripped(parts, PAGE_SEPARATOR)
+
+_gcld3_identifier = None
+
+def _gcld3_prediction(sample: str):
+    """Run Google's gcld3 bindings, creating the identifier on first use (one per process)"""
+    global _gcld3_identifier
+    if _gcld3_identifier is None:
+        _gcld3_identifier = gcld3.NNetLanguageIdentifier(min_num_bytes=0, max_num_bytes=CLD3_SAMPLE_CHARS)
+    return _gcld3_identifier.FindLanguage(text=sample)
+
+def detect_language_code(text: str) -> Optional[str]:
+    """ISO 639-1 code of the text's language, or None if it can't be determined"""
+    if CLD3_AVAILABLE or GCLD3_AVAILABLE:
+        sample = text[:CLD3_SAMPLE_CHARS]
+        prediction = cld3.get_language(sample) if CLD3_AVAILABLE else _gcld3_prediction(sample)
+        return prediction.language if prediction and prediction.is_reliable else None
+
+    from langdetect import detect
+    return detect(text[:LANGDETECT_SAMPLE_CHARS])
+
+# Detector output (ISO 639-1) -> supported language; anything else is treated as English
+SUPPORTED_LANGUAGES = {language.value: language for language in Language}
+
+def detect_language(text: str) -> Language:
+    """Supported language of ``text``, defaulting to English"""
+    try:
+        return SUPPORTED_LANGUAGES.get(detect_language_code(text), Language.ENGLISH)
+    except Exception:
+        return Language.ENGLISH
+
+def leading_lines(content: str):
+    """Stripped lines from the head of ``content`` without splitting the whole document"""
+    head = content[:TITLE_SCAN_CHARS]
+    lines = head.split("\n")
+    if len(content) > TITLE_SCAN_CHARS:
+        # The last line may be cut off mid-way
+        lines.pop()
+    return (line.strip() for line in lines)
+
+def decode_text(data: bytes) -> str:
+    """Decode text file bytes as UTF-8, falling back to latin-1 without re-reading the file"""
+    try:
+        return data.decode("utf-8").strip()
+    except UnicodeDecodeError:
+        return data.decode("latin-1").strip()
+
+def read_text_file(source: Union[str, BinaryIO]) -> str:
+    """Read a text file (path or binary file object) once and decode it"""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return decode_text(f.read())
+    return decode_text(source.read())
+
+def content_digest(source: Union[str, BinaryIO]) -> str:
+    """Hash of the file's bytes, used to recognise re-uploads of identical files"""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(DIGEST_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        source.seek(0)
+        for chunk in iter(lambda: source.read(DIGEST_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(0)
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """Small LRU of (text, detected language) keyed by file digest, so duplicate uploads skip parsing"""
+
+    # Very large texts aren't worth pinning in memory
+    MAX_TEXT_CHARS = 1_000_000
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[str, Any]]" = OrderedDict()
+
+    def get(self, digest: str) -> Optional[Tuple[str, Any]]:
+        entry = self._entries.get(digest)
+        if entry is not None:
+            self._entries.move_to_end(digest)
+        return entry
+
+    def put(self, digest: str, text: str, language: Any):
+        if self.max_size <= 0 or len(text) > self.MAX_TEXT_CHARS:
+            return
+        self._entries[digest] = (text, language)
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+extraction_cache = ExtractionCache(int(os.getenv("EXTRACTION_CACHE_SIZE", "64")))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Request body size limits enforced before upload bodies are read
+"""
+
+import logging
+from typing import Iterable
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class BodySizeLimitMiddleware:
+    """Reject upload requests whose body exceeds ``max_body_size`` without buffering it"""
+
+    def __init__(self, app, max_body_size: int, paths: Iterable[str]):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        # Declared length: answer 413 before a single body byte is read
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = JSONResponse(status_code=413, content={"detail": self._detail()})
+            await response(scope, receive, send)
+            return
+
+        # Chunked bodies (or lying headers): count while the app streams the body in
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    logger.warning(f"Rejected upload to {scope['path']}: body exceeds {self.max_body_size} bytes")
+                    raise HTTPException(status_code=413, detail=self._detail())
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    def _detail(self) -> str:
+        return f"Request body too large. Maximum size is {self.max_body_size // (1024 * 1024)}MB"